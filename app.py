@@ -2,8 +2,16 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 from data_manager import DataManager
 from notification_handler import NotificationHandler
+from notification_queue import NotificationQueue
+from coalescing_notifier import CoalescingNotifier
+from tk_executor import TkExecutor
+from virtual_tree import VirtualTreeview
+from storage import normalize_student_id
 from datetime import datetime
-import pandas as pd
+import os
+import time
+
+STUDENT_LIST_SIZE = 50  # rows loaded into a student dropdown at a time
 
 class AttendanceApp:
     def __init__(self, root):
@@ -19,10 +27,26 @@ class AttendanceApp:
         self.db = DataManager()
         # You can add real credentials here. Note: from_number must be 'whatsapp:+...'
         self.notifier = NotificationHandler()
+        # Marks are queued and each exam's subjects go out as one report per student.
+        # A teacher enters one exam in a sitting, so the desktop window is short.
+        self.outbox = NotificationQueue(self.notifier).start()
+        self.alerts = CoalescingNotifier(self.outbox, self.notifier,
+                                         window=float(os.environ.get('MARKS_COALESCE_WINDOW', '30')))
+        # Workbook I/O and Twilio calls run here so clicks never freeze the window
+        self.executor = TkExecutor(self.root, on_busy=self.set_busy)
 
         self.create_widgets()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def create_widgets(self):
+        # Status bar with a busy indicator while background work is pending
+        status_bar = ttk.Frame(self.root)
+        status_bar.pack(side='bottom', fill='x', padx=10, pady=(0, 5))
+        self.status_text = tk.StringVar(value="Ready")
+        ttk.Label(status_bar, textvariable=self.status_text).pack(side='left')
+        self.busy_bar = ttk.Progressbar(status_bar, mode='indeterminate', length=150)
+        self.busy_bar.pack(side='right')
+
         # Notebook for Tabs
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(expand=True, fill='both', pady=10, padx=10)
@@ -36,6 +60,7 @@ class AttendanceApp:
         self.marks_frame = ttk.Frame(self.notebook)
         self.notebook.add(self.marks_frame, text="Marks Entry")
         self.setup_marks_tab()
+        self.refresh_student_lists()
 
         # Tab 3: Student Master (Registration/Update)
         self.reg_frame = ttk.Frame(self.notebook)
@@ -52,9 +77,10 @@ class AttendanceApp:
         lbl_title.grid(row=0, column=0, columnspan=2, pady=20)
 
         ttk.Label(self.attn_frame, text="Select Student:").grid(row=1, column=0, padx=10, pady=5, sticky='e')
-        self.student_combo = ttk.Combobox(self.attn_frame, width=50, state="readonly")
+        self.student_combo = ttk.Combobox(self.attn_frame, width=50)
         self.student_combo.grid(row=1, column=1, padx=10, pady=5, sticky='w')
-        self.refresh_student_lists()
+        self.student_combo.student_ids = []
+        self.student_combo.bind('<KeyRelease>', lambda e: self.filter_student_list(self.student_combo, e))
 
         ttk.Label(self.attn_frame, text="Status:").grid(row=2, column=0, padx=10, pady=5, sticky='e')
         self.status_var = tk.StringVar(value="Present")
@@ -85,8 +111,10 @@ class AttendanceApp:
         lbl_title.grid(row=0, column=0, columnspan=2, pady=20)
 
         ttk.Label(self.marks_frame, text="Select Student:").grid(row=1, column=0, padx=10, pady=5, sticky='e')
-        self.marks_student_combo = ttk.Combobox(self.marks_frame, width=50, state="readonly")
+        self.marks_student_combo = ttk.Combobox(self.marks_frame, width=50)
         self.marks_student_combo.grid(row=1, column=1, padx=10, pady=5, sticky='w')
+        self.marks_student_combo.student_ids = []
+        self.marks_student_combo.bind('<KeyRelease>', lambda e: self.filter_student_list(self.marks_student_combo, e))
 
         ttk.Label(self.marks_frame, text="Subject:").grid(row=2, column=0, padx=10, pady=5, sticky='e')
         self.entry_subject = ttk.Entry(self.marks_frame, width=53)
@@ -123,21 +151,28 @@ class AttendanceApp:
         lbl_hint.grid(row=len(labels)+2, column=0, columnspan=2)
 
     def setup_view_tab(self):
+        filter_bar = ttk.Frame(self.view_frame)
+        filter_bar.pack(fill='x', pady=(10, 0))
+        ttk.Label(filter_bar, text="Filter:").pack(side='left', padx=5)
+        self.entry_filter = ttk.Entry(filter_bar, width=40)
+        self.entry_filter.pack(side='left')
+        self.entry_filter.bind('<KeyRelease>', self.filter_records)
+
         self.view_notebook = ttk.Notebook(self.view_frame)
         self.view_notebook.pack(expand=True, fill='both', pady=10)
 
-        # Student Master Tree
-        self.master_tree = self.create_treeview(self.view_notebook, "Student Master", 
+        # Student Master Tree (one row per Student ID)
+        self.master_table = self.create_treeview(self.view_notebook, "Student Master", 
             ("ID", "Name", "Dept", "Parent", "Phone"),
-            [100, 200, 100, 150, 150])
+            [100, 200, 100, 150, 150], key=lambda row: row[0])
 
         # Attendance Tree
-        self.attn_tree = self.create_treeview(self.view_notebook, "Daily Attendance", 
+        self.attn_table = self.create_treeview(self.view_notebook, "Daily Attendance", 
             ("Date", "ID", "Status", "Reason"),
             [100, 100, 100, 300])
 
         # Marks Tree
-        self.marks_tree = self.create_treeview(self.view_notebook, "Marks Records", 
+        self.marks_table = self.create_treeview(self.view_notebook, "Marks Records", 
             ("ID", "Subject", "Exam", "Marks"),
             [100, 150, 150, 100])
 
@@ -149,17 +184,35 @@ class AttendanceApp:
 
         self.load_all_records()
 
-    def create_treeview(self, parent_notebook, tab_name, columns, widths):
-        frame = ttk.Frame(parent_notebook)
-        parent_notebook.add(frame, text=tab_name)
-        
-        tree = ttk.Treeview(frame, columns=columns, show='headings')
-        for col, width in zip(columns, widths):
-            tree.heading(col, text=col)
-            tree.column(col, width=width)
-        
-        tree.pack(expand=True, fill='both', padx=5, pady=5)
-        return tree
+    def create_treeview(self, parent_notebook, tab_name, columns, widths, key=None):
+        # Only the visible rows exist as Treeview items; see virtual_tree.py
+        table = VirtualTreeview(parent_notebook, columns, widths, key)
+        parent_notebook.add(table.frame, text=tab_name)
+        return table
+
+    def set_busy(self, busy):
+        if busy:
+            self.status_text.set("Working...")
+            self.busy_bar.start(10)
+            self.root.config(cursor="watch")
+        else:
+            self.status_text.set("Ready")
+            self.busy_bar.stop()
+            self.root.config(cursor="")
+
+    def show_error(self, error):
+        messagebox.showerror("Error", str(error))
+
+    def on_close(self):
+        # Let queued writes finish before the window goes away
+        self.executor.shutdown()
+        # Send marks reports still collecting subjects now rather than on the next start
+        self.status_text.set("Sending pending notifications...")
+        self.root.update_idletasks()
+        self.outbox.release_coalesced()
+        self.outbox.drain(timeout=10)
+        self.outbox.stop()
+        self.root.destroy()
 
     def handle_registration(self):
         data = {k: v.get() for k, v in self.reg_entries.items()}
@@ -167,59 +220,71 @@ class AttendanceApp:
             messagebox.showerror("Error", "All fields are required!")
             return
 
-        success, msg = self.db.add_student(
+        row = (normalize_student_id(data["Student ID"]), data["Full Name"], data["Department"],
+               data["Parent Name"], data["Parent Mobile (WhatsApp)"])
+
+        def done(result):
+            success, msg = result
+            if success:
+                messagebox.showinfo("Success", msg)
+                self.refresh_student_lists()
+                self.master_table.upsert(row)
+            else:
+                messagebox.showerror("Error", msg)
+
+        self.executor.submit(lambda: self.db.add_student(
             data["Student ID"], 
             data["Full Name"], 
             data["Department"], 
             data["Parent Name"], 
             data["Parent Mobile (WhatsApp)"]
-        )
-        
-        if success:
-            messagebox.showinfo("Success", msg)
-            self.refresh_student_lists()
-            self.load_all_records()
-        else:
-            messagebox.showerror("Error", msg)
+        ), done, self.show_error)
 
     def handle_attendance(self):
-        selection = self.student_combo.get()
-        if not selection:
+        student_id = self.selected_student(self.student_combo)
+        if not student_id:
             messagebox.showerror("Error", "Please select a student.")
             return
 
-        student_id = selection.split(" - ")[0]
         status = self.status_var.get()
         reason = self.entry_reason.get() if status == "Absent" else ""
 
-        success, msg = self.db.mark_attendance(student_id, status, reason)
-        
-        if success:
-            if status == "Absent":
+        def work():
+            # Runs on the executor thread: no widget access here
+            success, msg = self.db.mark_attendance(student_id, status, reason)
+            if success and status == "Absent":
                 student_info = self.db.get_student_parent_info(student_id)
                 if student_info:
-                    notif_success, notif_msg = self.notifier.send_absence_notification(
-                        student_info['Parent Name'],
-                        student_info['Name'],
-                        str(student_info['Parent Phone Number']),
-                        datetime.now().strftime('%Y-%m-%d'),
-                        reason
-                    )
-                    msg += f"\n{notif_msg}"
-            
-            messagebox.showinfo("Success", msg)
-            self.entry_reason.delete(0, tk.END)
-            self.load_all_records()
-        else:
-            messagebox.showerror("Error", msg)
+                    # Queued at most once per student per day, even if re-marked after an archive
+                    queued_at = time.time()
+                    ticket = self.alerts.absence(student_info, datetime.now().strftime('%Y-%m-%d'), reason)
+                    notice = self.outbox.get(ticket)
+                    if notice and notice['created_at'] < queued_at:
+                        msg += f"\nParent was already alerted today (WhatsApp alert {notice['status']})."
+                    else:
+                        msg += "\nWhatsApp absence alert queued."
+            return success, msg
+
+        # The row the save adds to Daily Attendance, shown without a reload
+        row = (datetime.now().strftime('%Y-%m-%d'), normalize_student_id(student_id), status, reason)
+
+        def done(result):
+            success, msg = result
+            if success:
+                messagebox.showinfo("Success", msg)
+                self.entry_reason.delete(0, tk.END)
+                self.attn_table.append(row)
+            else:
+                messagebox.showerror("Error", msg)
+
+        self.executor.submit(work, done, self.show_error)
 
     def handle_marks(self):
-        selection = self.marks_student_combo.get()
-        if not selection:
+        student_id = self.selected_student(self.marks_student_combo)
+        if not student_id:
             messagebox.showerror("Error", "Please select a student.")
             return
 
-        student_id = selection.split(" - ")[0]
         subject = self.entry_subject.get()
         exam = self.entry_exam.get()
         marks = self.entry_marks.get()
@@ -228,68 +293,92 @@ class AttendanceApp:
             messagebox.showerror("Error", "All fields are required!")
             return
 
-        success, msg = self.db.add_marks(student_id, subject, exam, marks)
-        
-        if success:
-            student_info = self.db.get_student_parent_info(student_id)
-            if student_info:
-                notif_success, notif_msg = self.notifier.send_marks_notification(
-                    student_info['Parent Name'],
-                    student_info['Name'],
-                    str(student_info['Parent Phone Number']),
-                    subject,
-                    exam,
-                    marks
-                )
-                msg += f"\n{notif_msg}"
-            
-            messagebox.showinfo("Success", msg)
-            # Clear entries
-            self.entry_subject.delete(0, tk.END)
-            self.entry_exam.delete(0, tk.END)
-            self.entry_marks.delete(0, tk.END)
-            self.load_all_records()
-        else:
-            messagebox.showerror("Error", msg)
+        def work():
+            success, msg = self.db.add_marks(student_id, subject, exam, marks)
+            if success:
+                student_info = self.db.get_student_parent_info(student_id)
+                if student_info:
+                    self.alerts.marks(student_info, subject, exam, marks)
+                    msg += f"\nWhatsApp report for {exam} queued; marks entered within {self.alerts.window:g} seconds are sent together."
+            return success, msg
+
+        def done(result):
+            success, msg = result
+            if success:
+                messagebox.showinfo("Success", msg)
+                # Clear entries
+                self.entry_subject.delete(0, tk.END)
+                self.entry_exam.delete(0, tk.END)
+                self.entry_marks.delete(0, tk.END)
+                self.marks_table.append((normalize_student_id(student_id), subject, exam, marks))
+            else:
+                messagebox.showerror("Error", msg)
+
+        self.executor.submit(work, done, self.show_error)
 
     def handle_archive(self):
         if messagebox.askyesno("Confirm", "Archive today's attendance?"):
-            self.db.archive_attendance()
-            messagebox.showinfo("Success", "Records archived.")
-            self.load_all_records()
+            def done(_):
+                messagebox.showinfo("Success", "Records archived.")
+                self.attn_table.load([])
+            self.executor.submit(self.db.archive_attendance, done, self.show_error)
 
     def load_all_records(self):
-        # Refresh Student Master
-        self.clear_tree(self.master_tree)
-        df_master = self.db.get_all_students()
-        for _, row in df_master.iterrows():
-            self.master_tree.insert("", tk.END, values=(row['Student ID'], row['Name'], row['Department'], row['Parent Name'], row['Parent Phone Number']))
-
-        # Refresh Attendance
-        self.clear_tree(self.attn_tree)
+        # Coalesced: clicks and saves that queue up behind a slow read
+        # collapse into a single reload
+        self.executor.submit(self.fetch_all_records, self.show_all_records,
+                             self.show_error, key='records')
+
+    def fetch_all_records(self):
+        # Executor thread: read everything as plain row tuples
+        master = list(self.db.get_all_students()[
+            ['Student ID', 'Name', 'Department', 'Parent Name', 'Parent Phone Number']].itertuples(index=False, name=None))
         try:
-            df_attn = pd.read_excel(self.db.file_path, sheet_name='Daily Attendance')
-            for _, row in df_attn.iterrows():
-                self.attn_tree.insert("", tk.END, values=(row['Date'], row['Student ID'], row['Attendance Status'], row['Reason for Leave']))
-        except: pass
-
-        # Refresh Marks
-        self.clear_tree(self.marks_tree)
+            attn = list(self.db.get_daily_attendance()[
+                ['Date', 'Student ID', 'Attendance Status', 'Reason for Leave']].itertuples(index=False, name=None))
+        except: attn = []
         try:
-            df_marks = pd.read_excel(self.db.file_path, sheet_name='Marks Record')
-            for _, row in df_marks.iterrows():
-                self.marks_tree.insert("", tk.END, values=(row['Student ID'], row['Subject'], row['Exam Name'], row['Marks Obtained']))
-        except: pass
-
-    def clear_tree(self, tree):
-        for i in tree.get_children():
-            tree.delete(i)
+            marks = list(self.db.get_all_marks()[
+                ['Student ID', 'Subject', 'Exam Name', 'Marks Obtained']].itertuples(index=False, name=None))
+        except: marks = []
+        return master, attn, marks
+
+    def show_all_records(self, records):
+        master, attn, marks = records
+        self.master_table.load(master)
+        self.attn_table.load(attn)
+        self.marks_table.load(marks)
+
+    def filter_records(self, event=None):
+        text = self.entry_filter.get()
+        for table in (self.master_table, self.attn_table, self.marks_table):
+            table.set_filter(text)
 
     def refresh_student_lists(self):
-        df = self.db.get_all_students()
-        student_list = [f"{row['Student ID']} - {row['Name']}" for _, row in df.iterrows()]
-        self.student_combo['values'] = student_list
-        self.marks_student_combo['values'] = student_list
+        for combo in (self.student_combo, self.marks_student_combo):
+            self.filter_student_list(combo)
+
+    def filter_student_list(self, combo, event=None):
+        # Only one page of matches for the typed ID or name prefix is loaded,
+        # served from the StudentIndex instead of the whole roster
+        if event is not None and event.keysym in ('Up', 'Down', 'Return', 'Tab', 'Escape'):
+            return
+        text = combo.get().split(' - ')[0].strip()
+        query = {'id_prefix': text} if text[:1].isdigit() else {'name_prefix': text}
+
+        def done(rows):
+            # Keep the IDs alongside the labels instead of parsing them back out of the text
+            combo.student_ids = [r['Student ID'] for r in rows]
+            combo['values'] = [f"{r['Student ID']} - {r['Name']}" for r in rows]
+
+        # Keyed per combobox so fast typing only runs the latest lookup
+        self.executor.submit(lambda: self.db.students().page(limit=STUDENT_LIST_SIZE, **query)[0],
+                             done, self.show_error, key=('students', str(combo)))
+
+    def selected_student(self, combo):
+        # current() is -1 when the text doesn't match an entry in the list
+        i = combo.current()
+        return combo.student_ids[i] if i >= 0 else None
 
 if __name__ == "__main__":
     root = tk.Tk()
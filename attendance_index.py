@@ -0,0 +1,74 @@
+from bisect import bisect_left, insort
+
+import pandas as pd
+
+from storage import SHEET_COLUMNS, apply_schema, normalize_student_id
+
+COLUMNS = SHEET_COLUMNS['Daily Attendance']
+
+
+def _end(prefix):
+    # Sorts after every string that starts with `prefix` and before anything else
+    return prefix + '\uffff'
+
+
+def to_frame(records):
+    """Attendance records (dicts) as a frame with the sheet's schema."""
+    return apply_schema('Daily Attendance', pd.DataFrame(records, columns=COLUMNS), clean=False)
+
+
+class AttendanceIndex:
+    """
+    Daily Attendance indexed on (Date, Student ID), the sheet's unique key,
+    so "already marked today?" is a dictionary hit instead of a comparison
+    over the whole Date column.
+
+    Two sorted key lists back range queries: (Date, Student ID) for a day or
+    a date range, and (Student ID, Date) for one student's timeline. A range
+    is a contiguous run in one of them, found by bisection, so a query costs
+    O(log n + matches) however much attendance is stored.
+    """
+
+    def __init__(self, df_daily):
+        self.records = {}
+        df_daily = df_daily.astype(object).where(df_daily.notna(), None)
+        for record in df_daily.to_dict(orient='records'):
+            if record['Date'] is None or record['Student ID'] is None:
+                continue  # can't be looked up by key anyway
+            self.records[(record['Date'], record['Student ID'])] = record
+        self._by_date = sorted(self.records)
+        self._by_student = sorted((sid, date) for date, sid in self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, key):
+        date, student_id = key
+        return (date, normalize_student_id(student_id)) in self.records
+
+    def add(self, records):
+        """Index newly inserted records (already coerced to the sheet's schema)."""
+        for record in records:
+            key = (record['Date'], record['Student ID'])
+            if key not in self.records:
+                insort(self._by_date, key)
+                insort(self._by_student, key[::-1])
+            self.records[key] = dict(record)
+
+    def between(self, from_date=None, to_date=None):
+        """Records with from_date <= Date <= to_date (YYYY-MM-DD, inclusive; None = open), by date."""
+        lo = bisect_left(self._by_date, (from_date,)) if from_date else 0
+        hi = bisect_left(self._by_date, (_end(to_date),)) if to_date else len(self._by_date)
+        return [self.records[key] for key in self._by_date[lo:hi]]
+
+    def on_date(self, date):
+        return self.between(date, date)
+
+    def for_student(self, student_id, from_date=None, to_date=None):
+        """One student's records between from_date and to_date (inclusive), by date."""
+        sid = normalize_student_id(student_id)
+        if sid is None:
+            return []
+        lo = bisect_left(self._by_student, (sid, from_date or ''))
+        hi = bisect_left(self._by_student, (sid, _end(to_date or '')))
+        return [self.records[key[::-1]] for key in self._by_student[lo:hi]]
@@ -0,0 +1,69 @@
+# bench_attendance_today.py — shows that GET /api/attendance/today scales
+# linearly with the roster size.
+#
+#   python benchmarks/bench_attendance_today.py [--sizes 1000,2000,5000,10000,20000]
+#
+# For every roster size a fresh SQLite store is filled with synthetic
+# students, ~90% of them are marked for today, and the endpoint is timed
+# through the Flask test client. If the join is linear, the time per student
+# (last column) stays roughly flat as the roster grows.
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic  # noqa: E402
+
+
+def build_roster(db, n):
+    # ~90% of the class already marked today
+    synthetic.populate(db, n, history_days=0, marks_per_student=0, today_share=0.9)
+
+
+def time_request(server, client, url, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        # Every run builds the response; a cache hit would hide the join
+        server.responses.clear()
+        start = time.perf_counter()
+        response = client.get(url)
+        best = min(best, time.perf_counter() - start)
+        assert response.status_code == 200, response.data
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time GET /api/attendance/today for growing rosters.')
+    parser.add_argument('--sizes', default='1000,2000,5000,10000,20000')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(',')]
+
+    workdir = tempfile.mkdtemp(prefix='bench_today_')
+    os.chdir(workdir)
+    import server
+    client = server.app.test_client()
+
+    print(f"{'students':>10} {'seconds':>10} {'us/student':>12}")
+    results = []
+    for n in sizes:
+        build_roster(server.db, n)
+        seconds = time_request(server, client, '/api/attendance/today', args.repeat)
+        results.append((n, seconds))
+        print(f"{n:>10} {seconds:>10.4f} {seconds / n * 1e6:>12.2f}")
+
+    # Slope of log(time) against log(n): ~1.0 means linear, ~2.0 quadratic
+    (n0, t0), (n1, t1) = results[0], results[-1]
+    if n1 > n0:
+        import math
+        print(f"scaling exponent ~ {math.log(t1 / t0) / math.log(n1 / n0):.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+# run_benchmarks.py — times the DataManager and Flask API hot paths against
+# synthetic data of growing size and writes the results as JSON.
+#
+#   python benchmarks/run_benchmarks.py --students 1000,10000,50000 --history-days 0,365 \
+#       --output bench.json
+#   python benchmarks/run_benchmarks.py --compare bench.json      # flag regressions
+#
+# Every (backend, students, history days) scenario gets a fresh store in a temp
+# directory. Each operation is run --repeat times and the median/min wall time
+# in milliseconds is reported. With --compare, scenarios that got more than
+# --threshold percent slower than in the given file are listed and the exit
+# status is 1.
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd  # noqa: E402
+import synthetic  # noqa: E402
+
+
+def measure(fn, repeat, setup=None):
+    times = []
+    for i in range(repeat):
+        if setup:
+            setup(i)
+        start = time.perf_counter()
+        fn(i)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def operations(server, db, client, n):
+    """(name, fn, setup) for every timed operation. fn/setup take the run index."""
+    today = datetime.now().strftime('%Y-%m-%d')
+    unmarked = int(n * 0.5)   # populate() marks the first half of the class today
+    month_ago = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+
+    def get(url):
+        def run(_):
+            response = client.get(url)
+            assert response.status_code == 200, response.data
+        return run
+
+    def uncached(_):
+        # Time the build path, not a replay of the cached JSON body
+        server.responses.clear()
+
+    def refill_daily(_):
+        db.backend.replace_all({'Daily Attendance': synthetic.attendance_frame(n, today, share=0.5)})
+
+    return [
+        ('add_student (new)', lambda i: db.add_student(f"NEW{i}", 'New', 'CSE', 'P', '+9100'), None),
+        ('add_student (update)', lambda i: db.add_student(synthetic.student_id(i), 'Renamed', 'CSE', 'P', '+9100'), None),
+        ('mark_attendance', lambda i: db.mark_attendance(synthetic.student_id(unmarked + i), 'Present'), None),
+        ('mark_attendance_bulk (60)', lambda i: db.mark_attendance_bulk(
+            [{'student_id': synthetic.student_id(unmarked + 100 + i * 60 + k), 'status': 'Present'}
+             for k in range(60)]), None),
+        ('add_marks', lambda i: db.add_marks(synthetic.student_id(i), 'Maths', 'BENCH', 75), None),
+        ('get_student_parent_info', lambda i: db.get_student_parent_info(synthetic.student_id(n - 1 - i)), None),
+        ('student_attendance (30 days)', lambda i: db.student_attendance(synthetic.student_id(i), month_ago, today), None),
+        ('archive_attendance', lambda i: db.archive_attendance(), refill_daily),
+        ('GET /api/stats', get('/api/stats'), uncached),
+        ('GET /api/attendance/today', get('/api/attendance/today'), uncached),
+        ('GET /api/students', get('/api/students'), uncached),
+    ]
+
+
+def run_scenario(server, backend, students, history_days, repeat, excel_flush_interval):
+    from data_manager import DataManager
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    path = os.path.join(workdir, 'attendance.xlsx')
+    db = DataManager(path, backend=backend, flush_interval=excel_flush_interval)
+    start = time.perf_counter()
+    synthetic.populate(db, students, history_days)
+    setup_s = time.perf_counter() - start
+
+    from http_cache import JSONResponseCache
+    server.db = db
+    # The cache is bound to the DataManager whose version it checks
+    server.responses = JSONResponseCache(db.version)
+    client = server.app.test_client()
+    results = []
+    for name, fn, setup in operations(server, db, client, students):
+        times = measure(fn, repeat, setup)
+        results.append({
+            'backend': backend,
+            'students': students,
+            'history_days': history_days,
+            'op': name,
+            'median_ms': round(statistics.median(times), 3),
+            'min_ms': round(min(times), 3),
+            'runs': repeat,
+        })
+        print(f"  {name:<28} median {results[-1]['median_ms']:>10.2f} ms   min {results[-1]['min_ms']:>10.2f} ms",
+              file=sys.stderr)
+    db.close()
+    return results, setup_s
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(current, previous_path, threshold):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    key = lambda r: (r['backend'], r['students'], r['history_days'], r['op'])
+    before = {key(r): r for r in previous['results']}
+    regressions = []
+    for r in current['results']:
+        old = before.get(key(r))
+        if old and old['median_ms'] > 0:
+            change = (r['median_ms'] - old['median_ms']) / old['median_ms'] * 100
+            if change > threshold:
+                regressions.append((key(r), old['median_ms'], r['median_ms'], change))
+    for k, old, new, change in regressions:
+        print(f"REGRESSION {k}: {old:.2f} ms -> {new:.2f} ms (+{change:.0f}%)", file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark DataManager and Flask API hot paths.')
+    parser.add_argument('--backends', default='sqlite,excel')
+    parser.add_argument('--students', default='1000,10000')
+    parser.add_argument('--history-days', default='0,90')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--excel-flush-interval', type=float, default=0,
+                        help='0 times durable write-through; >0 times the in-memory write-behind path')
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    parser.add_argument('--compare', help='previous JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=20.0, help='regression threshold in percent')
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+    previous = os.path.abspath(args.compare) if args.compare else None
+
+    # server.py builds its own DataManager on import; keep it out of the repo
+    os.chdir(tempfile.mkdtemp(prefix='bench_server_'))
+    sys.stdout, real_stdout = sys.stderr, sys.stdout
+    import server
+    sys.stdout = real_stdout
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+            'excel_flush_interval': args.excel_flush_interval,
+        },
+        'scenarios': [],
+        'results': [],
+    }
+    for backend in args.backends.split(','):
+        for students in (int(s) for s in args.students.split(',')):
+            for days in (int(d) for d in args.history_days.split(',')):
+                print(f"{backend}: {students} students, {days} days of history", file=sys.stderr)
+                results, setup_s = run_scenario(server, backend, students, days, args.repeat,
+                                                args.excel_flush_interval)
+                report['results'].extend(results)
+                report['scenarios'].append({'backend': backend, 'students': students,
+                                            'history_days': days, 'setup_s': round(setup_s, 2)})
+
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if previous and compare(report, previous, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+# stress_attendance.py — hammer POST /api/attendance and POST /api/marks from
+# many processes at once and check that no rows were lost or duplicated.
+#
+#   python benchmarks/stress_attendance.py --backend sqlite --processes 8 --students 400
+#   python benchmarks/stress_attendance.py --backend excel --processes 4 --students 100
+#
+# Each process imports server.py (its own DataManager, as a gunicorn worker
+# would) in a shared temp directory. Every student is marked by two different
+# processes, so exactly one of the two requests must win; every process also
+# records one marks row per student it owns. Exits non-zero on any mismatch.
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def worker(workdir, env, student_ids):
+    os.chdir(workdir)
+    os.environ.update(env)
+    sys.stdout = open(os.devnull, 'w')  # mock WhatsApp output
+    import server
+    client = server.app.test_client()
+
+    marked, marks = 0, 0
+    for sid in student_ids:
+        r = client.post('/api/attendance', json={'student_id': sid, 'status': 'Present'})
+        marked += bool(r.json['success'])
+        r = client.post('/api/marks', json={'student_id': sid, 'subject': 'Maths', 'exam': 'CAT1', 'marks': 50})
+        marks += bool(r.json['success'])
+    server.db.close()
+    server.outbox.stop(timeout=1)
+    return marked, marks
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent write stress test for the attendance API.')
+    parser.add_argument('--backend', choices=['sqlite', 'excel'], default='sqlite')
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--students', type=int, default=400)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='stress_attendance_')
+    env = {'ATTENDANCE_BACKEND': args.backend, 'EXCEL_FLUSH_INTERVAL': '0'}
+    os.chdir(workdir)
+    os.environ.update(env)
+
+    from data_manager import DataManager
+    db = DataManager(backend=args.backend, flush_interval=0)
+    for i in range(args.students):
+        db.add_student(str(1000 + i), f"Student {i}", 'CSE', 'Parent', '+910000000000')
+    db.close()
+
+    # Process p owns students p, p+P, p+2P, ... and also races the next process on them
+    ids = [str(1000 + i) for i in range(args.students)]
+    jobs = []
+    for p in range(args.processes):
+        own = ids[p::args.processes]
+        rival = ids[(p + 1) % args.processes::args.processes]
+        jobs.append((workdir, env, own + rival))
+
+    start = time.perf_counter()
+    with multiprocessing.get_context('spawn').Pool(args.processes) as pool:
+        results = pool.starmap(worker, jobs)
+    elapsed = time.perf_counter() - start
+
+    marked = sum(r[0] for r in results)
+    marks_ok = sum(r[1] for r in results)
+    requests = sum(len(j[2]) for j in jobs)
+
+    db = DataManager(backend=args.backend, flush_interval=0)
+    df_daily = db.get_daily_attendance()
+    df_marks = db.get_all_marks()
+    db.close()
+
+    unique_daily = df_daily.drop_duplicates(['Date', 'Student ID'])
+    checks = {
+        'attendance rows == students': len(df_daily) == args.students,
+        'no duplicate (Date, Student ID)': len(unique_daily) == len(df_daily),
+        'successful attendance responses == students': marked == args.students,
+        'marks rows == marks requests': len(df_marks) == marks_ok == requests,
+    }
+
+    print(f"backend={args.backend} processes={args.processes} requests={requests * 2} "
+          f"in {elapsed:.2f}s ({requests * 2 / elapsed:.0f} req/s)")
+    print(f"attendance rows={len(df_daily)} marked responses={marked} marks rows={len(df_marks)}")
+    for name, ok in checks.items():
+        print(f"  [{'ok' if ok else 'FAIL'}] {name}")
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == '__main__':
+    main()
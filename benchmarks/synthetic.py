@@ -0,0 +1,69 @@
+# synthetic.py — reproducible fake rosters, attendance and marks for the benchmarks.
+
+import random
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+DEPARTMENTS = ['CSE', 'ECE', 'EEE', 'MECH', 'CIVIL', 'IT']
+SUBJECTS = ['Maths', 'Physics', 'Chemistry', 'English', 'Programming', 'Electronics']
+EXAMS = ['CAT1', 'CAT2', 'MODEL']
+
+
+def student_id(i):
+    return str(100000 + i)
+
+
+def students_frame(n):
+    return pd.DataFrame({
+        'Student ID': [student_id(i) for i in range(n)],
+        'Name': [f"Student {i}" for i in range(n)],
+        'Department': [DEPARTMENTS[i % len(DEPARTMENTS)] for i in range(n)],
+        'Parent Name': [f"Parent {i}" for i in range(n)],
+        'Parent Phone Number': [f"+9190{i:08d}" for i in range(n)],
+    })
+
+
+def attendance_frame(n, day, seed=0, share=1.0):
+    """One day's attendance for the first share*n students, ~8% absent."""
+    rng = random.Random(seed)
+    count = int(n * share)
+    absent = [rng.random() < 0.08 for _ in range(count)]
+    return pd.DataFrame({
+        'Date': day,
+        'Student ID': [student_id(i) for i in range(count)],
+        'Attendance Status': ['Absent' if a else 'Present' for a in absent],
+        'Reason for Leave': ['Sick' if a else '' for a in absent],
+    })
+
+
+def marks_frame(n, per_student=6, seed=0):
+    rng = random.Random(seed)
+    rows = n * per_student
+    return pd.DataFrame({
+        'Student ID': [student_id(i // per_student) for i in range(rows)],
+        'Subject': [SUBJECTS[i % len(SUBJECTS)] for i in range(rows)],
+        'Exam Name': [EXAMS[(i // len(SUBJECTS)) % len(EXAMS)] for i in range(rows)],
+        'Marks Obtained': [rng.randint(20, 100) for _ in range(rows)],
+    })
+
+
+def populate(db, students, history_days=0, marks_per_student=6, today_share=0.5):
+    """
+    Fill a DataManager with `students` students, `history_days` archived school
+    days ending yesterday, marks, and today's attendance for today_share of the class.
+    """
+    db.backend.replace_all({
+        'Student Master': students_frame(students),
+        'Marks Record': marks_frame(students, marks_per_student),
+        'Daily Attendance': attendance_frame(students, datetime.now().strftime('%Y-%m-%d'), share=today_share),
+    })
+    day = date.today()
+    frames = []
+    for d in range(history_days):
+        day -= timedelta(days=1)
+        frames.append(attendance_frame(students, day.isoformat(), seed=d))
+        # Write a month at a time to keep memory flat for big rosters
+        if len(frames) == 30 or d == history_days - 1:
+            db.history.append(pd.concat(frames, ignore_index=True))
+            frames = []
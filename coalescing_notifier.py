@@ -0,0 +1,39 @@
+from message_templates import templates
+
+
+class CoalescingNotifier:
+    """
+    Parent alerts on top of a NotificationQueue. Marks entered for the same
+    student and exam within `window` seconds of the first one go out as a
+    single report listing every subject, instead of one message per subject.
+    An absence alert is queued at most once per student per day.
+    """
+
+    def __init__(self, queue, handler, window=120.0):
+        self.queue = queue
+        self.handler = handler
+        self.window = window
+
+    def absence(self, student_info, date, reason):
+        return self.absences([(student_info, date, reason)])[0]
+
+    def absences(self, alerts):
+        """Queue (student_info, date, reason) alerts in one transaction. Returns their tickets."""
+        bodies = templates().get('absence').render_many(
+            {'parent_name': info['Parent Name'], 'student_name': info['Name'], 'date': date, 'reason': reason}
+            for info, date, reason in alerts)
+        messages = [(str(info['Parent Phone Number']), body) for (info, _, _), body in zip(alerts, bodies)]
+        keys = [f"absence:{info['Student ID']}:{date}" for info, date, _ in alerts]
+        return self.queue.enqueue_many(messages, kind='absence', dedupe_keys=keys)
+
+    def marks(self, student_info, subject, exam, marks):
+        name, student_id = student_info['Name'], student_info['Student ID']
+        return self.queue.enqueue_coalesced(
+            str(student_info['Parent Phone Number']),
+            f"marks:{student_id}:{exam}",
+            subject,
+            marks,
+            render=lambda parts: self.handler.marks_report_message(name, exam, parts, reg_no=student_id),
+            window=self.window,
+            kind='marks',
+        )
@@ -1,117 +1,407 @@
 import pandas as pd
 import os
+import threading
 from datetime import datetime
+from storage import (SHEET_COLUMNS, ExcelBackend, SQLiteBackend, StorageBackend, coerce_record, empty_sheet,
+                     normalize_student_id)
+from history_store import HistoryStore
+from student_index import StudentIndex
+from attendance_index import AttendanceIndex, to_frame
+from stats import StatsAggregator
+from marks_rollup import MarksRollup
+from reports import SHORTAGE_THRESHOLD, attendance_report
+
+def _unchanged(view, result):
+    """_commit updater for views a write does not affect."""
+
 
 class DataManager:
-    def __init__(self, file_path='attendance.xlsx'):
+    """
+    Student, attendance and marks records behind a pluggable storage backend.
+
+    backend='sqlite' (default) keeps the live data in an indexed SQLite file next
+    to the workbook; attendance.xlsx is imported on first run and can be exported
+    again with export_excel(). backend='excel' keeps the workbook as the store of
+    record behind an in-memory cache that is written back every flush_interval
+    seconds.
+
+    Attendance History lives in an append-only, month-partitioned HistoryStore
+    (attendance_history/ next to the workbook); rows found in the backend's
+    own history sheet are migrated into it on startup.
+
+    Every sheet has a declared schema (storage.SHEET_SCHEMA): loaded frames
+    come back with those dtypes, and each record is coerced to it before it
+    is written. Invalid input (e.g. non-numeric marks) is refused with a
+    (False, message) result instead of being stored.
+
+    Derived views (the StudentIndex, the (Date, Student ID) AttendanceIndex,
+    the dashboard StatsAggregator, the MarksRollup behind marks analytics)
+    are built lazily and tagged with the backend's data version. Writes made through this
+    DataManager update them incrementally; any other change to the data (e.g.
+    from another process) makes them rebuild on next use.
+    """
+
+    REPORT_CACHE_SIZE = 16
+
+    def __init__(self, file_path='attendance.xlsx', backend='sqlite', flush_interval=5.0, history_dir=None):
         self.file_path = file_path
-        self._initialize_excel()
-
-    def _initialize_excel(self):
-        if not os.path.exists(self.file_path):
-            with pd.ExcelWriter(self.file_path, engine='openpyxl') as writer:
-                # Sheet 1 – Student Master
-                df_master = pd.DataFrame(columns=['Student ID', 'Name', 'Department', 'Parent Name', 'Parent Phone Number'])
-                df_master.to_excel(writer, sheet_name='Student Master', index=False)
-                
-                # Sheet 2 – Daily Attendance
-                df_daily = pd.DataFrame(columns=['Date', 'Student ID', 'Attendance Status', 'Reason for Leave'])
-                df_daily.to_excel(writer, sheet_name='Daily Attendance', index=False)
-                
-                # Sheet 3 – Attendance History
-                df_history = pd.DataFrame(columns=['Date', 'Student ID', 'Attendance Status', 'Reason for Leave'])
-                df_history.to_excel(writer, sheet_name='Attendance History', index=False)
-
-                # Sheet 4 – Marks Record
-                df_marks = pd.DataFrame(columns=['Student ID', 'Subject', 'Exam Name', 'Marks Obtained'])
-                df_marks.to_excel(writer, sheet_name='Marks Record', index=False)
-            print(f"Initialized {self.file_path}")
+        self.history = HistoryStore(history_dir or os.path.splitext(file_path)[0] + '_history')
+        if isinstance(backend, StorageBackend):
+            self.backend = backend
+        elif backend == 'excel':
+            self.backend = ExcelBackend(file_path, flush_interval)
+        elif backend == 'sqlite':
+            self.backend = SQLiteBackend(os.path.splitext(file_path)[0] + '.db')
+            if self.backend.created and os.path.exists(file_path):
+                self.import_excel(file_path)
+                print(f"Imported {file_path} into {self.backend.db_path}")
+        else:
+            raise ValueError(f"Unknown storage backend: {backend}")
+
+        self._lock = threading.RLock()
+        self._views = {}    # name -> (data version, view)
+        self.migrate_history()
+
+    def _view(self, name, build):
+        with self._lock:
+            version = self.backend.version()
+            cached = self._views.get(name)
+            if cached is None or cached[0] != version:
+                cached = (version, build())
+                self._views[name] = cached
+            return cached[1]
+
+    def _commit(self, write, **updates):
+        """
+        Run a backend write and bring the derived views along. A view that was
+        current before the write and has an updater (keyed by its name, or the
+        first element of a tuple name) gets updater(view, result) applied; every
+        other view is dropped and rebuilt on next use.
+
+        The backend's cross-process lock is held throughout, so no other
+        process can write between reading `before` and `after`.
+        """
+        with self._lock, self.backend.lock():
+            before = self.backend.version()
+            result = write()
+            after = self.backend.version()
+            for name, (version, view) in list(self._views.items()):
+                update = updates.get(name if isinstance(name, str) else name[0])
+                if version != before or update is None:
+                    del self._views[name]
+                    continue
+                update(view, result)
+                self._views[name] = (after, view)
+            return result
+
+    def version(self):
+        """Opaque token that changes whenever the stored data does (in any process)."""
+        return self.backend.version()
+
+    def students(self):
+        """StudentIndex over Student Master, keyed by canonical Student ID."""
+        return self._view('students', lambda: StudentIndex(self.backend.read('Student Master')))
+
+    def attendance(self):
+        """AttendanceIndex over Daily Attendance, keyed by (Date, Student ID)."""
+        return self._view('attendance', lambda: AttendanceIndex(self.backend.read('Daily Attendance')))
+
+    def stats(self):
+        """StatsAggregator with the dashboard counters."""
+        return self._view('stats', lambda: StatsAggregator(
+            self.backend.read('Student Master'),
+            self.backend.read('Daily Attendance'),
+            self.backend.read('Marks Record')))
+
+    def marks_rollup(self):
+        """MarksRollup with marks aggregated by subject, exam and department."""
+        return self._view('marks', lambda: MarksRollup(
+            self.backend.read('Student Master'),
+            self.backend.read('Marks Record')))
+
+    def attendance_report(self, from_date=None, to_date=None, dept=None, threshold=SHORTAGE_THRESHOLD):
+        """
+        Attendance percentage per student over Daily Attendance + Attendance
+        History between from_date and to_date (inclusive, YYYY-MM-DD), with a
+        Shortage flag below threshold. Cached per (range, dept, threshold)
+        until attendance or the roster changes.
+        """
+        def build():
+            df_daily = to_frame(self.attendance().between(from_date, to_date))
+            df_all = pd.concat([self.history.read(from_date, to_date), df_daily], ignore_index=True)
+            df_students = self.backend.read('Student Master')
+            if dept:
+                df_students = df_students[df_students['Department'] == dept]
+            return attendance_report(df_students, df_all, threshold)
+
+        key = ('report', from_date, to_date, dept, threshold)
+        with self._lock:
+            # Keep only the most recent few report ranges around
+            others = [name for name in self._views if isinstance(name, tuple) and name[0] == 'report' and name != key]
+            for name in others[:max(len(others) - self.REPORT_CACHE_SIZE + 1, 0)]:
+                del self._views[name]
+            return self._view(key, build)
+
+    def close(self):
+        self.backend.close()
 
     def add_student(self, student_id, name, dept, parent_name, parent_phone):
-        df_master = pd.read_excel(self.file_path, sheet_name='Student Master')
-        if student_id in df_master['Student ID'].values:
-            # Update existing student if ID exists
-            idx = df_master.index[df_master['Student ID'] == student_id].tolist()[0]
-            df_master.loc[idx, 'Name'] = name
-            df_master.loc[idx, 'Department'] = dept
-            df_master.loc[idx, 'Parent Name'] = parent_name
-            df_master.loc[idx, 'Parent Phone Number'] = parent_phone
-            msg = "Student info updated."
-        else:
-            new_student = {
+        try:
+            record = coerce_record('Student Master', {
                 'Student ID': student_id,
                 'Name': name,
                 'Department': dept,
                 'Parent Name': parent_name,
                 'Parent Phone Number': parent_phone
-            }
-            df_master = pd.concat([df_master, pd.DataFrame([new_student])], ignore_index=True)
-            msg = "Student added successfully."
-        
-        with pd.ExcelWriter(self.file_path, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-            df_master.to_excel(writer, sheet_name='Student Master', index=False)
-        return True, msg
+            })
+        except ValueError as e:
+            return False, str(e)
+        old = self.students().get(record['Student ID'])
+        existed = old is not None
+        # Marks already counted under the old department have to be regrouped,
+        # so the per-department stats and the rollup are rebuilt on a move
+        moved = existed and old['Department'] != record['Department']
+        self._commit(
+            lambda: self.backend.upsert_student(record),
+            students=lambda index, _: index.upsert(record),
+            attendance=_unchanged,
+            stats=None if moved else lambda stats, _: stats.student_added(record),
+            marks=None if moved else lambda rollup, _: rollup.student_added(record))
+        if existed:
+            return True, "Student info updated."
+        return True, "Student added successfully."
+
+    def add_students_bulk(self, records):
+        """
+        Insert or update many Student Master records (dicts keyed by sheet
+        column) in one commit. Returns one True/False per record: whether
+        the student already existed.
+        """
+        records = [coerce_record('Student Master', r) for r in records]
+
+        def count_students(stats, _):
+            for record in records:
+                stats.student_added(record)
+
+        # Marks and attendance counted under a student's old department have
+        # to be regrouped, so the stats are rebuilt if any department changes
+        known = self.students().records
+        moved = any(r['Student ID'] in known and known[r['Student ID']]['Department'] != r['Department']
+                    for r in records)
+
+        # The StudentIndex is rebuilt on next use; re-sorting it once is
+        # cheaper than inserting thousands of students one by one. So is the
+        # MarksRollup, since imported students may have changed department.
+        return self._commit(
+            lambda: self.backend.upsert_students(records) if records else [],
+            attendance=_unchanged,
+            stats=None if moved else count_students)
 
     def get_all_students(self):
-        return pd.read_excel(self.file_path, sheet_name='Student Master')
+        return self.backend.read('Student Master')
+
+    def get_daily_attendance(self):
+        return self.backend.read('Daily Attendance')
+
+    def get_attendance_history(self, from_date=None, to_date=None, student_id=None):
+        """Archived attendance, optionally limited to a date range (inclusive) and/or one student."""
+        return self.history.read(from_date, to_date, normalize_student_id(student_id))
+
+    def student_attendance(self, student_id, from_date=None, to_date=None):
+        """
+        One student's attendance between from_date and to_date (inclusive,
+        YYYY-MM-DD), archived and current, in date order. Both parts are range
+        scans: the HistoryStore opens only the months in range and filters on
+        the student inside each file, and Daily Attendance comes from the
+        (Student ID, Date) side of the AttendanceIndex.
+        """
+        student_id = normalize_student_id(student_id)
+        if student_id is None:
+            return empty_sheet('Daily Attendance')
+        df_history = self.history.read(from_date, to_date, student_id)
+        df_daily = to_frame(self.attendance().for_student(student_id, from_date, to_date))
+        df = pd.concat([df_history.astype(object), df_daily.astype(object)], ignore_index=True)
+        return df.sort_values('Date', kind='stable').reset_index(drop=True)
+
+    def migrate_history(self):
+        """
+        Move rows from the backend's 'Attendance History' sheet/table into the
+        partitioned HistoryStore. Safe to re-run: a batch is written at most once.
+        """
+        with self.backend.lock():
+            df_history = self.backend.read('Attendance History')
+            if df_history.empty:
+                return 0
+            written = self.history.append(df_history)
+            self.backend.replace_all({'Attendance History': empty_sheet('Attendance History')})
+        print(f"Migrated {len(df_history)} Attendance History rows to {self.history.root}")
+        return written
+
+    def get_today_attendance(self, dept=None):
+        """
+        Every student with today's attendance status ('Pending' if not marked),
+        built as one keyed merge on Student ID instead of a per-student scan.
+        """
+        date_str = datetime.now().strftime('%Y-%m-%d')
+        df_students = self.get_all_students()[['Student ID', 'Name', 'Department']]
+        if dept:
+            df_students = df_students[df_students['Department'] == dept]
+        # Today's rows are one range of the (Date, Student ID) index
+        df_today = to_frame(self.attendance().on_date(date_str))[['Student ID', 'Attendance Status']]
+
+        # IDs are already canonical strings on both sides, so this is a plain hash join
+        merged = df_students.merge(df_today, on='Student ID', how='left')
+        # 'Pending' isn't one of the category's values, so fill as plain objects
+        merged['Status'] = merged['Attendance Status'].astype(object).fillna('Pending')
+        return merged[['Student ID', 'Name', 'Status']]
+
+    def get_all_marks(self):
+        return self.backend.read('Marks Record')
 
     def mark_attendance(self, student_id, status, reason=''):
         date_str = datetime.now().strftime('%Y-%m-%d')
-        df_daily = pd.read_excel(self.file_path, sheet_name='Daily Attendance')
-        
-        # Check if already marked for today
-        mask = (df_daily['Date'] == date_str) & (df_daily['Student ID'] == student_id)
-        if not df_daily[mask].empty:
+        try:
+            new_entry = coerce_record('Daily Attendance', {
+                'Date': date_str,
+                'Student ID': student_id,
+                'Attendance Status': status,
+                'Reason for Leave': reason if status == 'Absent' else ''
+            })
+        except ValueError as e:
+            return False, str(e)
+        # Most repeats are caught here without taking the write lock; the
+        # backend's unique key still decides if two requests race
+        if (date_str, new_entry['Student ID']) in self.attendance():
+            return False, "Attendance already marked for this student today."
+        inserted = self._commit(
+            lambda: self.backend.insert_attendance(new_entry),
+            students=_unchanged,
+            marks=_unchanged,
+            attendance=lambda index, ok: index.add([new_entry] if ok else []),
+            stats=lambda stats, ok: stats.attendance_marked([new_entry] if ok else []))
+        if not inserted:
             return False, "Attendance already marked for this student today."
-
-        # Add entry
-        new_entry = {
-            'Date': date_str,
-            'Student ID': student_id,
-            'Attendance Status': status,
-            'Reason for Leave': reason if status == 'Absent' else ''
-        }
-        df_daily = pd.concat([df_daily, pd.DataFrame([new_entry])], ignore_index=True)
-
-        with pd.ExcelWriter(self.file_path, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-            df_daily.to_excel(writer, sheet_name='Daily Attendance', index=False)
-        
         return True, "Attendance marked."
 
+    def mark_attendance_bulk(self, entries):
+        """
+        Mark a whole class at once. entries is a list of dicts with student_id,
+        status and optional reason; everything new is committed in one write.
+        Returns one result dict per entry, in order.
+        """
+        date_str = datetime.now().strftime('%Y-%m-%d')
+        results = []
+        records = []
+        for entry in entries:
+            if not isinstance(entry, dict):
+                results.append({'success': False, 'message': "Each record must be an object."})
+                continue
+            student_id = entry.get('student_id')
+            status = entry.get('status')
+            result = {'student_id': student_id, 'status': status, 'success': False}
+            results.append(result)
+            reason = entry.get('reason', '') if status == 'Absent' else ''
+            try:
+                # Checked per entry, so one bad row can't fail the whole batch
+                record = coerce_record('Daily Attendance', {
+                    'Date': date_str,
+                    'Student ID': student_id,
+                    'Attendance Status': status,
+                    'Reason for Leave': reason
+                })
+            except ValueError as e:
+                result['message'] = str(e)
+                continue
+            result['reason'] = reason
+            records.append((result, record))
+
+        new_entries = [r for _, r in records]
+        inserted = self._commit(
+            lambda: self.backend.insert_attendance_many(new_entries) if new_entries else [],
+            students=_unchanged,
+            marks=_unchanged,
+            attendance=lambda index, ok: index.add([r for r, o in zip(new_entries, ok) if o]),
+            stats=lambda stats, ok: stats.attendance_marked([r for r, o in zip(new_entries, ok) if o]))
+        for (result, _), ok in zip(records, inserted):
+            result['success'] = ok
+            result['message'] = "Attendance marked." if ok else "Attendance already marked for this student today."
+        return results
+
     def add_marks(self, student_id, subject, exam, marks):
-        df_marks = pd.read_excel(self.file_path, sheet_name='Marks Record')
-        
-        new_mark = {
-            'Student ID': student_id,
-            'Subject': subject,
-            'Exam Name': exam,
-            'Marks Obtained': marks
-        }
-        df_marks = pd.concat([df_marks, pd.DataFrame([new_mark])], ignore_index=True)
-        
-        with pd.ExcelWriter(self.file_path, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-            df_marks.to_excel(writer, sheet_name='Marks Record', index=False)
+        try:
+            new_mark = coerce_record('Marks Record', {
+                'Student ID': student_id,
+                'Subject': subject,
+                'Exam Name': exam,
+                'Marks Obtained': marks
+            })
+        except ValueError as e:
+            return False, str(e)
+        self._commit(
+            lambda: self.backend.append('Marks Record', [new_mark]),
+            students=_unchanged,
+            attendance=_unchanged,
+            report=_unchanged,
+            stats=lambda stats, _: stats.marks_added([new_mark]),
+            marks=lambda rollup, _: rollup.marks_added([new_mark]))
         return True, "Marks recorded."
 
+    def add_marks_bulk(self, records):
+        """
+        Upsert many Marks Record rows (dicts keyed by sheet column) in one
+        commit: marks for a (Student ID, Subject, Exam Name) already stored
+        are replaced. Returns one True/False per record: whether it replaced
+        stored marks.
+        """
+        records = [coerce_record('Marks Record', r) for r in records]
+        if not records:
+            return []
+        with self._lock:
+            replaced = self._commit(
+                lambda: self.backend.upsert_marks(records),
+                students=_unchanged,
+                attendance=_unchanged,
+                report=_unchanged,
+                stats=lambda stats, _: stats.marks_added(records),
+                marks=lambda rollup, _: rollup.marks_added(records))
+            if any(replaced):
+                # The counters can't take the old marks back out: rebuild them
+                self._views.pop('stats', None)
+                self._views.pop('marks', None)
+        return replaced
+
     def get_student_parent_info(self, student_id):
-        df_master = pd.read_excel(self.file_path, sheet_name='Student Master')
-        # Ensure student_id is compared correctly (as string or int depending on storage)
-        student = df_master[df_master['Student ID'].astype(str) == str(student_id)]
-        if not student.empty:
-            return student.iloc[0].to_dict()
-        return None
+        return self.students().get(student_id)
 
     def archive_attendance(self):
-        df_daily = pd.read_excel(self.file_path, sheet_name='Daily Attendance')
-        df_history = pd.read_excel(self.file_path, sheet_name='Attendance History')
-        
-        df_history = pd.concat([df_history, df_daily], ignore_index=True)
-        
-        # Clear daily attendance
-        df_daily_empty = pd.DataFrame(columns=['Date', 'Student ID', 'Attendance Status', 'Reason for Leave'])
-        
-        with pd.ExcelWriter(self.file_path, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-            df_history.to_excel(writer, sheet_name='Attendance History', index=False)
-            df_daily_empty.to_excel(writer, sheet_name='Daily Attendance', index=False)
+        # Only today's rows are written, as new partition files; older history is never touched.
+        # Holding the lock means nobody can mark attendance between the read and the clear.
+        with self._lock, self.backend.lock():
+            self.history.append(self.backend.read('Daily Attendance'))
+            self._commit(
+                lambda: self.backend.replace_all({'Daily Attendance': empty_sheet('Daily Attendance')}),
+                students=_unchanged,
+                report=_unchanged,
+                marks=_unchanged,
+                stats=lambda stats, _: stats.daily_archived())
         return True
 
+    def import_excel(self, path):
+        """
+        Load an attendance workbook into the backend, replacing its contents.
+        The Attendance History sheet is appended to the HistoryStore instead.
+        """
+        sheets = pd.read_excel(path, sheet_name=None, dtype=object)
+        history = sheets.pop('Attendance History', None)
+        self.backend.replace_all({name: df for name, df in sheets.items() if name in SHEET_COLUMNS})
+        if history is not None:
+            self.history.append(history)
+
+    def export_excel(self, path=None):
+        """Write all four sheets to an Excel workbook (attendance.xlsx by default)."""
+        path = path or self.file_path
+        with pd.ExcelWriter(path, engine='openpyxl') as writer:
+            for sheet in SHEET_COLUMNS:
+                df = self.get_attendance_history() if sheet == 'Attendance History' else self.backend.read(sheet)
+                df.to_excel(writer, sheet_name=sheet, index=False)
+        return path
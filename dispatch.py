@@ -0,0 +1,239 @@
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class TokenBucket:
+    """
+    Allows `rate` acquisitions per second on average, with bursts of up to
+    `burst`. acquire() blocks until a token is free. rate=None means no limit.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class Dispatcher:
+    """
+    Sends a stream of (key, to, body) jobs with send(to, body) from
+    `concurrency` worker threads, no faster than the token bucket allows.
+    A send fails if it raises or returns False. A failed recipient is put
+    back for another try after backoff**attempt seconds (up to `retries`
+    more times) while the workers carry on with other recipients.
+
+    on_result(key, to, ok, error) is called once per job with its final
+    outcome. progress(done, total, failed, eta_seconds) is called at most
+    every `progress_interval` seconds and once at the end; total and eta are
+    None when the caller doesn't know how many jobs there are.
+
+    Jobs are pulled from the iterable only as workers free up, so a lazy
+    generator is never read far ahead of what has been sent.
+    """
+
+    def __init__(self, send, rate=1.0, burst=1, concurrency=1, retries=2, backoff=2.0,
+                 on_result=None, progress=None, progress_interval=5.0):
+        self.send = send
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = max(concurrency, 1)
+        self.retries = retries
+        self.backoff = backoff
+        self.on_result = on_result
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._ready = deque()
+        self._retry = []
+
+    def stop(self):
+        """Stop after the sends already in flight; unsent jobs are dropped."""
+        with self._cond:
+            self._stopped = True
+            self._ready.clear()
+            self._retry.clear()
+            self._cond.notify_all()
+
+    def run(self, jobs, total=None):
+        """Send every job and return (sent, failed)."""
+        self._ready = deque()      # (job, attempt) not tried yet
+        self._retry = []           # heap of (due, seq, job, attempt)
+        self._seq = itertools.count()
+        self._inflight = 0
+        self._feeding = True
+        self._sent = self._failed = 0
+        self._total = total
+        self._started = self._reported = time.monotonic()
+        self._reported_done = 0
+
+        workers = [threading.Thread(target=self._work, daemon=True) for _ in range(self.concurrency)]
+        for w in workers:
+            w.start()
+        try:
+            for job in jobs:
+                with self._cond:
+                    while len(self._ready) >= self.concurrency and not self._stopped:
+                        self._cond.wait()
+                    if self._stopped:
+                        break
+                    self._ready.append((job, 0))
+                    self._cond.notify_all()
+        finally:
+            with self._cond:
+                self._feeding = False
+                self._cond.notify_all()
+            for w in workers:
+                w.join()
+        self._report(final=True)
+        return self._sent, self._failed
+
+    def _next(self):
+        """Next (job, attempt) to send, or None when everything is finished."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._retry and self._retry[0][0] <= now:
+                    _, _, job, attempt = heapq.heappop(self._retry)
+                    break
+                if self._ready:
+                    job, attempt = self._ready.popleft()
+                    self._cond.notify_all()  # room for the feeder
+                    break
+                if not self._feeding and not self._retry and not self._inflight:
+                    return None
+                self._cond.wait(self._retry[0][0] - now if self._retry else None)
+            self._inflight += 1
+            return job, attempt
+
+    def _work(self):
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            job, attempt = item
+            key, to, body = job
+            self.bucket.acquire()
+            error = None
+            try:
+                if self.send(to, body) is False:
+                    error = "send failed"
+            except Exception as e:
+                error = str(e)
+
+            with self._cond:
+                self._inflight -= 1
+                if error is not None and attempt < self.retries and not self._stopped:
+                    due = time.monotonic() + self.backoff ** (attempt + 1)
+                    heapq.heappush(self._retry, (due, next(self._seq), job, attempt + 1))
+                else:
+                    if error is None:
+                        self._sent += 1
+                    else:
+                        self._failed += 1
+                    if self.on_result:
+                        self.on_result(key, to, error is None, error)
+                self._cond.notify_all()
+            self._report()
+
+    def _report(self, final=False):
+        if not self.progress:
+            return
+        with self._cond:
+            now = time.monotonic()
+            done = self._sent + self._failed
+            if final and done == self._reported_done:
+                return
+            if not final and now - self._reported < self.progress_interval:
+                return
+            self._reported, self._reported_done = now, done
+            eta = None
+            if self._total and done:
+                eta = (now - self._started) / done * max(self._total - done, 0)
+            self.progress(done, self._total, self._failed, eta)
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SendJob:
+    """
+    Checkpoint for one bulk send of a workbook. Every recipient's final
+    outcome is appended as a JSON line to <directory>/<workbook hash>-<channel>.jsonl
+    and fsynced, so after a crash or sleep a rerun of the same file skips
+    everyone already sent and carries on with the rest. Editing the workbook
+    changes its hash and starts a new job.
+
+    Recipients are keyed by the caller (e.g. Reg No, or row number when there
+    is none). A send that was in flight when the process died has no record
+    and is sent again.
+    """
+
+    def __init__(self, workbook_path, channel='', directory='jarvis_jobs'):
+        os.makedirs(directory, exist_ok=True)
+        self.workbook_hash = file_hash(workbook_path)
+        name = f"{self.workbook_hash[:16]}-{channel}" if channel else self.workbook_hash[:16]
+        self.path = os.path.join(directory, name + '.jsonl')
+        self.status = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:  # torn last line from a crash
+                        continue
+                    self.status[entry['key']] = entry['status']
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def sent_count(self):
+        return sum(1 for s in self.status.values() if s == 'sent')
+
+    def is_sent(self, key):
+        return self.status.get(key) == 'sent'
+
+    def record(self, key, to, ok, error=None):
+        entry = {'key': key, 'to': str(to), 'status': 'sent' if ok else 'failed',
+                 'error': error, 'at': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        with self._lock:
+            self.status[key] = entry['status']
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def reset(self):
+        """Forget every recorded outcome so the whole workbook is sent again."""
+        with self._lock:
+            self.status.clear()
+            self._file.truncate(0)
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
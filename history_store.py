@@ -0,0 +1,196 @@
+import glob
+import hashlib
+import json
+import os
+import uuid
+import pandas as pd
+from instrumentation import phase
+from storage import SHEET_COLUMNS, apply_schema, empty_sheet
+
+# Parquet needs pyarrow; without it partitions are written as CSV instead.
+try:
+    import pyarrow  # noqa: F401
+except Exception:
+    pyarrow = None
+
+COLUMNS = SHEET_COLUMNS['Attendance History']
+# Rows per Parquet row group. Each group's Student ID min/max lets a
+# one-student read skip the others, so a part is never decoded whole.
+ROW_GROUP_ROWS = 4096
+# A month holding this many part files is merged into one on the next append
+COMPACT_PARTS = 8
+
+
+class HistoryStore:
+    """
+    Append-only Attendance History, partitioned by month:
+
+        attendance_history/month=2025-01/part-<id>.parquet
+
+    Archiving writes one new part file per month it touches. Once a month has
+    COMPACT_PARTS parts they are merged into one, so daily archiving doesn't
+    leave reads opening dozens of small files. Reads only open the partitions
+    that overlap the requested date range, and push the Student ID filter
+    down into the Parquet reader.
+
+    A merged part has a compacted-<id>.json next to it listing the parts it
+    replaced and every batch id they held. Readers skip replaced parts as
+    soon as the merged one is renamed into place, and a batch that was merged
+    is still recognised when it is archived again.
+    """
+
+    def __init__(self, root='attendance_history'):
+        self.root = root
+        self.ext = '.parquet' if pyarrow else '.csv'
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def _clean(df):
+        # Dates may come back from Excel as timestamps; the schema makes them YYYY-MM-DD text
+        df = apply_schema('Attendance History', df.reindex(columns=COLUMNS)).astype(object)
+        df = df[df['Date'].str.fullmatch(r'\d{4}-\d{2}-\d{2}', na=False)]
+        return df.fillna('').astype(str)
+
+    @staticmethod
+    def batch_id(df):
+        """Content hash of a batch, so re-archiving the same rows is a no-op."""
+        digest = hashlib.sha1(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+        return digest.hexdigest()[:16]
+
+    def partitions(self):
+        months = [d.split('=', 1)[1] for d in os.listdir(self.root) if d.startswith('month=')]
+        return sorted(months)
+
+    @staticmethod
+    def _part_id(path):
+        return os.path.splitext(os.path.basename(path))[0][len('part-'):]
+
+    def _manifests(self, directory):
+        """{merged part id: manifest} for the merged parts present in directory."""
+        manifests = {}
+        for path in glob.glob(os.path.join(directory, 'compacted-*.json')):
+            part_id = os.path.splitext(os.path.basename(path))[0][len('compacted-'):]
+            # A manifest whose part was never renamed into place (crash) doesn't count
+            if not os.path.exists(os.path.join(directory, f'part-{part_id}{self.ext}')):
+                continue
+            try:
+                with open(path, encoding='utf-8') as f:
+                    manifests[part_id] = json.load(f)
+            except FileNotFoundError:
+                continue
+        return manifests
+
+    def _files(self, month):
+        directory = os.path.join(self.root, f'month={month}')
+        replaced = {name for m in self._manifests(directory).values() for name in m['parts']}
+        return [path for path in sorted(glob.glob(os.path.join(directory, 'part-*')))
+                if os.path.basename(path) not in replaced]
+
+    def _has_batch(self, directory, batch_id):
+        if os.path.exists(os.path.join(directory, f'part-{batch_id}{self.ext}')):
+            return True
+        return any(batch_id in m['batches'] for m in self._manifests(directory).values())
+
+    def _write(self, part, path):
+        # Sorted by student so the Parquet row-group statistics prune well
+        part = part.sort_values(['Student ID', 'Date'], kind='stable')
+        tmp = os.path.join(os.path.dirname(path), f'.tmp-{uuid.uuid4().hex}{self.ext}')
+        with phase('write'):
+            if pyarrow:
+                part.to_parquet(tmp, index=False, row_group_size=ROW_GROUP_ROWS)
+            else:
+                part.to_csv(tmp, index=False)
+            os.replace(tmp, path)
+
+    def append(self, df, batch_id=None):
+        """Write df as new partition files. Returns the number of rows written."""
+        df = self._clean(df)
+        if df.empty:
+            return 0
+        batch_id = batch_id or self.batch_id(df)
+        written = 0
+        for month, part in df.groupby(df['Date'].str[:7], sort=True):
+            directory = os.path.join(self.root, f'month={month}')
+            os.makedirs(directory, exist_ok=True)
+            if self._has_batch(directory, batch_id):
+                continue
+            self._write(part, os.path.join(directory, f'part-{batch_id}{self.ext}'))
+            written += len(part)
+            if len(self._files(month)) >= COMPACT_PARTS:
+                self.compact(month)
+        return written
+
+    def compact(self, month):
+        """
+        Merge a month's parts into one. The manifest is written first and the
+        merged part renamed into place second, which is the point where
+        readers switch over; the replaced files are deleted after that.
+        """
+        directory = os.path.join(self.root, f'month={month}')
+        files = self._files(month)
+        if len(files) < 2:
+            return 0
+        manifests = self._manifests(directory)
+        batches = set()
+        for path in files:
+            part_id = self._part_id(path)
+            batches.update(manifests[part_id]['batches'] if part_id in manifests else [part_id])
+        with phase('parse'):
+            df = pd.concat([self._read_file(path, None, None, None) for path in files], ignore_index=True)
+        merged_id = hashlib.sha1(' '.join(sorted(batches)).encode('utf-8')).hexdigest()[:16]
+        manifest = os.path.join(directory, f'compacted-{merged_id}.json')
+        with open(manifest, 'w', encoding='utf-8') as f:
+            json.dump({'parts': [os.path.basename(p) for p in files], 'batches': sorted(batches)}, f)
+        self._write(df, os.path.join(directory, f'part-{merged_id}{self.ext}'))
+        for path in files:
+            os.remove(path)
+            stale = os.path.join(directory, f'compacted-{self._part_id(path)}.json')
+            if os.path.exists(stale):
+                os.remove(stale)
+        return len(files)
+
+    def _read_file(self, path, student_id, from_date, to_date):
+        if path.endswith('.parquet'):
+            # Parts are sorted by Student ID in ROW_GROUP_ROWS groups; pyarrow skips
+            # every group whose Student ID / Date range can't match
+            filters = [('Student ID', '==', student_id)] if student_id is not None else []
+            if from_date:
+                filters.append(('Date', '>=', from_date))
+            if to_date:
+                filters.append(('Date', '<=', to_date))
+            return pd.read_parquet(path, filters=filters or None)
+        df = pd.read_csv(path, dtype=str, keep_default_na=False)
+        return df[df['Student ID'] == student_id] if student_id is not None else df
+
+    def _read_month(self, month, student_id, from_date, to_date, attempts=3):
+        for attempt in range(attempts):
+            try:
+                frames = []
+                for path in self._files(month):
+                    with phase('parse'):
+                        frames.append(self._read_file(path, student_id, from_date, to_date))
+                return frames
+            except FileNotFoundError:
+                # The month was compacted between listing and reading; list it again
+                if attempt == attempts - 1:
+                    raise
+
+    def read(self, from_date=None, to_date=None, student_id=None):
+        """Rows with from_date <= Date <= to_date (YYYY-MM-DD strings, inclusive)."""
+        frames = []
+        for month in self.partitions():
+            if from_date and month < from_date[:7]:
+                continue
+            if to_date and month > to_date[:7]:
+                continue
+            frames.extend(self._read_month(month, student_id, from_date, to_date))
+        if not frames:
+            return empty_sheet('Attendance History')
+        df = pd.concat(frames, ignore_index=True)
+        if from_date:
+            df = df[df['Date'] >= from_date]
+        if to_date:
+            df = df[df['Date'] <= to_date]
+        # Statuses repeat on every row; as a category they cost a byte each
+        df = apply_schema('Attendance History', df, clean=False)
+        return df.sort_values('Date', kind='stable').reset_index(drop=True)
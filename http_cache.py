@@ -0,0 +1,66 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask import Response, current_app, request
+
+from instrumentation import phase
+
+
+class JSONResponseCache:
+    """
+    Serialized JSON bodies cached per data version. `version` is a callable
+    (DataManager.version); an entry is reused until it changes, so polling an
+    unchanged endpoint costs neither the pandas work nor the JSON encoding.
+
+    The ETag is a hash of the body rather than the version number, so it is
+    the same in every server process that holds the same data and a 304 is
+    never sent for content the client hasn't seen. Last-Modified is when
+    this process first built the current body.
+    """
+
+    def __init__(self, version, max_entries=64):
+        self.version = version
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (version, body, etag, last_modified, headers)
+        self._lock = threading.Lock()
+
+    def clear(self):
+        """Forget every cached body, so the next request of each key is built afresh."""
+        with self._lock:
+            self._entries.clear()
+
+    def respond(self, key, build):
+        """
+        Conditional JSON response for `key`. build() returns the payload, or
+        (payload, extra_headers), and is only called when the data changed.
+        """
+        version = self.version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None or entry[0] != version:
+            with phase('compute'):
+                payload = build()
+            headers = {}
+            if isinstance(payload, tuple):
+                payload, headers = payload
+            with phase('serialize'):
+                body = current_app.json.dumps(payload).encode('utf-8') + b'\n'
+            entry = (version, body, hashlib.blake2b(body, digest_size=16).hexdigest(),
+                     datetime.now(timezone.utc).replace(microsecond=0), headers)
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        _, body, etag, last_modified, headers = entry
+        response = Response(body, mimetype='application/json', headers=headers)
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        # Clients may keep the body but must revalidate before using it
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
@@ -0,0 +1,246 @@
+"""
+Bulk import of the student roster and exam marks from CSV or Excel files.
+
+    python importer.py students roster.csv
+    python importer.py marks cat1.xlsx --dry-run --report cat1_errors.csv
+
+The file is read in chunks of CHUNK_ROWS rows, each chunk is validated with
+column-wise pandas checks, and every valid row is written in a single commit
+(DataManager.add_students_bulk / add_marks_bulk). Invalid rows are skipped
+and listed in the report with their row number in the file.
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import pandas as pd
+from storage import normalize_student_ids, normalize_text
+
+# .xlsx files are streamed with openpyxl when it is installed
+try:
+    import openpyxl
+except Exception:
+    openpyxl = None
+
+CHUNK_ROWS = 5000
+
+# Header spellings accepted for each sheet column (compared ignoring case,
+# spaces and punctuation)
+STUDENT_ALIASES = {
+    'Student ID': ['student id', 'id', 'reg no', 'register number', 'roll no'],
+    'Name': ['name', 'student name', 'full name'],
+    'Department': ['department', 'dept'],
+    'Parent Name': ['parent name', 'parent', 'guardian'],
+    'Parent Phone Number': ['parent phone number', 'parent phone', 'parent mobile', 'phone', 'mobile', 'whatsapp'],
+}
+MARKS_ALIASES = {
+    'Student ID': ['student id', 'id', 'reg no', 'register number', 'roll no'],
+    'Subject': ['subject', 'course'],
+    'Exam Name': ['exam name', 'exam'],
+    'Marks Obtained': ['marks obtained', 'marks', 'score'],
+}
+STUDENT_REQUIRED = ['Student ID', 'Name', 'Parent Phone Number']
+MARKS_REQUIRED = ['Student ID', 'Subject', 'Exam Name', 'Marks Obtained']
+
+# Optional +, then 10-15 digits once spaces, dashes, dots and brackets are removed
+PHONE_PATTERN = r'\+?\d{10,15}'
+
+
+def _header_key(name):
+    return re.sub(r'[^a-z0-9]+', ' ', str(name).lower()).strip()
+
+
+def _cell(value):
+    return normalize_text(value) or ''
+
+
+def read_chunks(source, filename=None, chunk_rows=CHUNK_ROWS):
+    """
+    Yield the first sheet of a CSV or Excel file (path or file object) as
+    DataFrames of up to chunk_rows rows with every cell as a stripped string.
+    The index of each chunk is the row number in the file (the header is row 1).
+    """
+    name = (filename or (source if isinstance(source, str) else getattr(source, 'name', '')) or '').lower()
+    if name.endswith(('.xlsx', '.xlsm')) and openpyxl is not None:
+        wb = openpyxl.load_workbook(source, read_only=True, data_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            header = [_cell(c) for c in next(rows, ())]
+            chunk, first = [], 2
+            for row_no, row in enumerate(rows, start=2):
+                cells = [_cell(c) for c in row[:len(header)]]
+                chunk.append(cells + [''] * (len(header) - len(cells)))
+                if len(chunk) == chunk_rows:
+                    yield pd.DataFrame(chunk, columns=header, index=range(first, row_no + 1))
+                    chunk, first = [], row_no + 1
+            if chunk or first == 2:
+                yield pd.DataFrame(chunk, columns=header, index=range(first, first + len(chunk)))
+        finally:
+            wb.close()
+    elif name.endswith(('.xlsx', '.xlsm', '.xls')):
+        df = pd.read_excel(source, dtype=object).apply(lambda col: col.map(_cell))
+        df.index = df.index + 2
+        for start in range(0, max(len(df), 1), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+    else:
+        reader = pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunk_rows)
+        for df in reader:
+            df.index = df.index + 2
+            yield df.fillna('').apply(lambda col: col.str.strip())
+
+
+def _map_columns(df, aliases, required):
+    """
+    Pick the file's columns by header and name them as the sheet does;
+    missing optional columns come back blank. Rows with no values are dropped.
+    """
+    lookup = {_header_key(alias): column for column, names in aliases.items() for alias in names}
+    positions = {}
+    for i, header in enumerate(df.columns):
+        column = lookup.get(_header_key(header))
+        if column and column not in positions:
+            positions[column] = i
+    missing = [c for c in required if c not in positions]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}. Found: {', '.join(map(str, df.columns))}")
+    df = df.iloc[:, list(positions.values())].set_axis(list(positions), axis=1)
+    df = df.reindex(columns=list(aliases), fill_value='')
+    return df[(df != '').any(axis=1)]
+
+
+def _collect_errors(df, checks, report):
+    """Add a report entry for every row failing one of the (mask, message) checks; returns the good rows."""
+    bad = pd.Series(False, index=df.index)
+    messages = {}
+    for mask, message in checks:
+        bad |= mask
+        for row in df.index[mask]:
+            messages.setdefault(row, []).append(message)
+    for row in sorted(messages):
+        report['errors'].append({'row': int(row), 'student_id': df.at[row, 'Student ID'], 'errors': messages[row]})
+    return df[~bad]
+
+
+def _new_report(dry_run):
+    return {'rows': 0, 'imported': 0, 'errors': [], 'dry_run': dry_run}
+
+
+def import_students(db, source, filename=None, dry_run=False, chunk_rows=CHUNK_ROWS):
+    """
+    Validate a roster file and upsert every valid student in one commit.
+    A row needs a Student ID, a Name and a phone number of 10-15 digits;
+    a Student ID repeated further down the file is reported, not imported.
+    """
+    report = _new_report(dry_run)
+    report.update(added=0, updated=0)
+    records, seen = [], set()
+    for chunk in read_chunks(source, filename, chunk_rows):
+        df = _map_columns(chunk, STUDENT_ALIASES, STUDENT_REQUIRED).copy()
+        report['rows'] += len(df)
+        df['Student ID'] = normalize_student_ids(df['Student ID'])
+        df['Parent Phone Number'] = df['Parent Phone Number'].str.replace(r'[\s\-().]', '', regex=True)
+        ids = df['Student ID']
+        good = _collect_errors(df, [
+            (ids == '', "Student ID is required"),
+            (df['Name'] == '', "Name is required"),
+            (~df['Parent Phone Number'].str.fullmatch(PHONE_PATTERN), "Invalid phone number"),
+            ((ids != '') & (ids.duplicated() | ids.isin(seen)), "Duplicate Student ID in file"),
+        ], report)
+        seen.update(ids[ids != ''])
+        records.extend(good.to_dict(orient='records'))
+
+    report['imported'] = len(records)
+    if records and not dry_run:
+        existed = db.add_students_bulk(records)
+        report['updated'] = sum(existed)
+        report['added'] = len(existed) - report['updated']
+    return report
+
+
+def import_marks(db, source, filename=None, dry_run=False, chunk_rows=CHUNK_ROWS):
+    """
+    Validate a marks file and upsert every valid row in one commit. A row
+    needs a Student ID on the roster, a Subject, an Exam Name and numeric,
+    non-negative marks; a repeated (Student ID, Subject, Exam Name) is reported.
+    Marks already stored for a student, subject and exam are replaced, so
+    importing the same file twice doesn't count them twice.
+    """
+    report = _new_report(dry_run)
+    report.update(added=0, updated=0)
+    known = set(db.students().records)
+    records, seen = [], set()
+    for chunk in read_chunks(source, filename, chunk_rows):
+        df = _map_columns(chunk, MARKS_ALIASES, MARKS_REQUIRED).copy()
+        report['rows'] += len(df)
+        df['Student ID'] = normalize_student_ids(df['Student ID'])
+        ids = df['Student ID']
+        marks = pd.to_numeric(df['Marks Obtained'], errors='coerce')
+        keys = pd.Series(list(zip(ids, df['Subject'].str.casefold(), df['Exam Name'].str.casefold())), index=df.index)
+        good = _collect_errors(df, [
+            (ids == '', "Student ID is required"),
+            ((ids != '') & ~ids.isin(known), "Student ID is not on the roster"),
+            (df['Subject'] == '', "Subject is required"),
+            (df['Exam Name'] == '', "Exam Name is required"),
+            (marks.isna() | (marks < 0), "Marks must be a non-negative number"),
+            (keys.duplicated() | keys.isin(seen), "Duplicate marks for this subject and exam in file"),
+        ], report)
+        seen.update(keys)
+        good = good.assign(**{'Marks Obtained': marks[good.index]})
+        records.extend(good.to_dict(orient='records'))
+
+    report['imported'] = len(records)
+    if records and not dry_run:
+        replaced = db.add_marks_bulk(records)
+        report['updated'] = sum(replaced)
+        report['added'] = len(replaced) - report['updated']
+    return report
+
+
+IMPORTERS = {'students': import_students, 'marks': import_marks}
+
+
+def write_error_report(report, path):
+    """Write a report's row errors as CSV (row, student_id, error), one line per error."""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['row', 'student_id', 'error'])
+        for entry in report['errors']:
+            for message in entry['errors']:
+                writer.writerow([entry['row'], entry['student_id'], message])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import students or marks from a CSV/Excel file.")
+    parser.add_argument('kind', choices=sorted(IMPORTERS))
+    parser.add_argument('path')
+    parser.add_argument('--dry-run', action='store_true', help="validate only, write nothing")
+    parser.add_argument('--report', help="write row errors to this CSV file")
+    parser.add_argument('--backend', default=os.environ.get('ATTENDANCE_BACKEND', 'sqlite'))
+    args = parser.parse_args(argv)
+
+    from data_manager import DataManager
+    db = DataManager(backend=args.backend, flush_interval=0)
+    try:
+        report = IMPORTERS[args.kind](db, args.path, dry_run=args.dry_run)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    finally:
+        db.close()
+
+    if args.report:
+        write_error_report(report, args.report)
+    summary = {k: v for k, v in report.items() if k != 'errors'}
+    summary['rejected'] = len(report['errors'])
+    print(json.dumps(summary, indent=2))
+    for entry in report['errors'][:20]:
+        print(f"  row {entry['row']} ({entry['student_id'] or '-'}): {'; '.join(entry['errors'])}")
+    if len(report['errors']) > 20:
+        print(f"  ... {len(report['errors']) - 20} more" + (f" in {args.report}" if args.report else ""))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,243 @@
+import cProfile
+import glob
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency histogram buckets in seconds (Prometheus defaults)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_local = threading.local()
+
+
+@contextmanager
+def phase(name):
+    """
+    Time a block as one phase of the current request ('parse', 'write',
+    'compute', 'serialize', 'notify'). Times are exclusive: a phase nested in
+    another is subtracted from its parent. A no-op outside an instrumented
+    request, so storage and DataManager code can use it unconditionally.
+    """
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        yield
+        return
+    frame = [0.0]  # time spent in nested phases
+    stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stack.pop()
+        if stack:
+            stack[-1][0] += elapsed
+        _local.timings[name] = _local.timings.get(name, 0.0) + elapsed - frame[0]
+
+
+def begin_request():
+    _local.stack = []
+    _local.timings = {}
+
+
+def end_request():
+    timings = getattr(_local, 'timings', {})
+    _local.stack = None
+    _local.timings = {}
+    return timings
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += seconds
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            yield f'{name}_bucket{_labels(labels, le=repr(bound))} {cumulative}'
+        yield f'{name}_bucket{_labels(labels, le="+Inf")} {self.count}'
+        yield f'{name}_sum{_labels(labels)} {self.sum:.6f}'
+        yield f'{name}_count{_labels(labels)} {self.count}'
+
+
+def _labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    """
+    In-process request metrics: a request counter and latency histogram per
+    endpoint, a histogram per (endpoint, phase), and one per notification
+    send. render() returns Prometheus text exposition format. Each process
+    (e.g. each gunicorn worker) keeps its own numbers.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._requests = {}   # (method, endpoint, status) -> count
+        self._latency = {}    # (method, endpoint) -> Histogram
+        self._phases = {}     # (endpoint, phase) -> Histogram
+        self._sends = {}      # (kind, outcome) -> Histogram
+
+    def _histogram(self, table, key):
+        if key not in table:
+            table[key] = Histogram(self.buckets)
+        return table[key]
+
+    def observe_request(self, method, endpoint, status, seconds, timings):
+        with self._lock:
+            key = (method, endpoint, str(status))
+            self._requests[key] = self._requests.get(key, 0) + 1
+            self._histogram(self._latency, (method, endpoint)).observe(seconds)
+            for name, value in timings.items():
+                self._histogram(self._phases, (endpoint, name)).observe(value)
+
+    def observe_send(self, kind, outcome, seconds):
+        with self._lock:
+            self._histogram(self._sends, (kind or '', outcome)).observe(seconds)
+
+    def render(self):
+        out = []
+        with self._lock:
+            out.append('# HELP attendance_http_requests_total HTTP requests handled.')
+            out.append('# TYPE attendance_http_requests_total counter')
+            for (method, endpoint, status), n in sorted(self._requests.items()):
+                labels = (('method', method), ('endpoint', endpoint), ('status', status))
+                out.append(f'attendance_http_requests_total{_labels(labels)} {n}')
+
+            out.append('# HELP attendance_http_request_duration_seconds Request latency by endpoint.')
+            out.append('# TYPE attendance_http_request_duration_seconds histogram')
+            for (method, endpoint), h in sorted(self._latency.items()):
+                out.extend(h.lines('attendance_http_request_duration_seconds',
+                                   (('method', method), ('endpoint', endpoint))))
+
+            out.append('# HELP attendance_http_request_phase_seconds Time spent per request phase '
+                       '(parse, write, compute, serialize, notify).')
+            out.append('# TYPE attendance_http_request_phase_seconds histogram')
+            for (endpoint, name), h in sorted(self._phases.items()):
+                out.extend(h.lines('attendance_http_request_phase_seconds',
+                                   (('endpoint', endpoint), ('phase', name))))
+
+            out.append('# HELP attendance_notification_send_seconds WhatsApp send latency by outcome.')
+            out.append('# TYPE attendance_notification_send_seconds histogram')
+            for (kind, outcome), h in sorted(self._sends.items()):
+                out.extend(h.lines('attendance_notification_send_seconds',
+                                   (('kind', kind), ('outcome', outcome))))
+        return '\n'.join(out) + '\n'
+
+
+class SlowRequestProfiler:
+    """
+    Runs cProfile on a sample of requests and keeps the profile only when the
+    request took at least threshold_ms. At most one request is profiled at a
+    time; the `keep` slowest profiles are kept in `directory` as .prof files
+    named after their duration and endpoint (open with snakeviz or pstats).
+    """
+
+    def __init__(self, directory='profiles', threshold_ms=500.0, sample_rate=1.0, keep=20):
+        self.directory = directory
+        self.threshold_ms = threshold_ms
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self._busy = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self):
+        if random.random() >= self.sample_rate or not self._busy.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # another profiler is active in this process
+            self._busy.release()
+            return None
+        return profile
+
+    def cancel(self, profile):
+        profile.disable()
+        self._busy.release()
+
+    def finish(self, profile, endpoint, seconds):
+        self.cancel(profile)
+        ms = seconds * 1000
+        if ms < self.threshold_ms:
+            return None
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', endpoint).strip('_') or 'root'
+        path = os.path.join(self.directory, f"{ms:09.1f}ms-{slug}-{int(time.time() * 1000)}.prof")
+        profile.dump_stats(path)
+        # File names sort by duration; drop all but the slowest `keep`
+        for old in sorted(glob.glob(os.path.join(self.directory, '*.prof')), reverse=True)[self.keep:]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+        return path
+
+
+def instrument(app, metrics=None, profiler=None):
+    """
+    Hook request timing into a Flask app: every response gets a Server-Timing
+    header with its phases and total, latencies go to `metrics` (served at
+    /api/metrics), and slow requests are profiled by `profiler`.
+    """
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timing():
+        begin_request()
+        g.profile = profiler.start() if profiler else None
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def _finish_timing(response):
+        start = g.pop('request_start', None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        timings = end_request()
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+
+        profile = g.pop('profile', None)
+        if profile is not None:
+            profiler.finish(profile, endpoint, elapsed)
+        if metrics is not None and endpoint != '/api/metrics':
+            metrics.observe_request(request.method, endpoint, response.status_code, elapsed, timings)
+
+        parts = [f'{name};dur={value * 1000:.2f}' for name, value in timings.items()]
+        parts.append(f'total;dur={elapsed * 1000:.2f}')
+        response.headers['Server-Timing'] = ', '.join(parts)
+        return response
+
+    @app.teardown_request
+    def _abandon_timing(exc):
+        # after_request does not run when a view raises; don't leak the profiler
+        profile = g.pop('profile', None)
+        if profile is not None:
+            profiler.cancel(profile)
+        end_request()
+
+    if metrics is not None:
+        @app.route('/api/metrics', methods=['GET'])
+        def get_metrics():
+            return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -7,13 +7,14 @@ import threading
 import queue
 import webbrowser
 import re
-import time
 import subprocess
 import sys
 from datetime import datetime
 import urllib.parse
 import tkinter as tk
 from tkinter import ttk, scrolledtext, filedialog, messagebox
+from dispatch import Dispatcher, SendJob
+from message_templates import templates
 
 # Optional speech + TTS
 try:
@@ -26,16 +27,33 @@ try:
 except Exception:
     pyttsx3 = None
 
-# Excel handling
+# Excel handling (openpyxl streams .xlsx; pandas is the fallback and reads .xls)
+try:
+    import openpyxl
+except Exception:
+    openpyxl = None
+
 try:
     import pandas as pd
 except Exception:
     pd = None
 
+# Twilio API channel (needs the twilio package and TWILIO_* credentials)
+try:
+    from notification_handler import NotificationHandler
+except Exception:
+    NotificationHandler = None
+
 # ---------------- CONFIG ----------------
 SPEAK_RATE = 165
 WAKE_WORD = "hey jarvis"
-SEND_DELAY_BETWEEN = 1.0
+SEND_DELAY_BETWEEN = 1.0                # desktop channel: seconds between chats
+SEND_CHANNEL = os.environ.get("JARVIS_SEND_CHANNEL", "desktop")   # or "api"
+API_SEND_RATE = 5.0                     # api channel: messages per second
+API_SEND_CONCURRENCY = 4
+SEND_RETRIES = 2
+PROGRESS_INTERVAL = 5.0                 # seconds between progress lines
+JOBS_DIR = "jarvis_jobs"                # bulk-send checkpoints, one file per workbook
 DEFAULT_EXCEL_PATH = r"C:\Users\tirup\Documents\marks.xlsx"
 
 # ---------------- UTILITIES ----------------
@@ -112,26 +130,16 @@ def find_excel_file(default_path=None):
 
 # ---------------- MESSAGE BUILDER ----------------
 def build_message_whatsapp_format(whatsapp_no, reg_no, name, marks_dict):
-    """Generate WhatsApp message in RMKCET format."""
-    lines = [
-        f"WHATSAPP NUMBER : {whatsapp_no if whatsapp_no else ''}",
-        "Dear Student/Parent :",
-        f"REG_NO : {reg_no if reg_no else ''}",
-        f"NAME : {name if name else ''}",
-    ]
-    for subj, val in marks_dict.items():
-        lines.append(f"{subj} : {val if val else ''}")
-    lines.append("")
-    lines.append("Regards,")
-    lines.append("PRINCIPAL")
-    lines.append("")
-    lines.append("RMKCET")
-    return "\n".join(lines)
+    """Generate WhatsApp message in RMKCET format (the 'jarvis_marks' template)."""
+    return templates().render("jarvis_marks", {
+        "whatsapp_no": whatsapp_no, "reg_no": reg_no, "name": name, "marks": marks_dict,
+    })
 
 
 # ---------------- EXCEL HANDLING ----------------
 def detect_required_columns(df):
-    headers = [str(c).strip() for c in df.columns]
+    """Pick the REG/NAME/PHONE and subject columns from a DataFrame or a header row."""
+    headers = [str(c).strip() for c in getattr(df, "columns", df)]
     lower = [h.lower() for h in headers]
 
     def find_by_tokens(tokens):
@@ -154,7 +162,7 @@ def detect_required_columns(df):
     used_cols = [reg_col, name_col, phone_col]
     subjects_found = {}
     for col in headers:
-        if col not in used_cols and col.lower() not in ["email", "address", "gender"]:
+        if col and col not in used_cols and col.lower() not in ["email", "address", "gender"]:
             subjects_found[col] = col
 
     return {
@@ -165,16 +173,131 @@ def detect_required_columns(df):
     }
 
 
-def send_marks_from_excel(path=None, gui_write=None):
-    """Read Excel and open WhatsApp chats with pre-filled messages."""
+def _plain(value):
+    """Cell value as the workbook shows it: blanks as '', 9876543210.0 as 9876543210."""
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def iter_excel_rows(path):
+    """
+    Yield the first sheet of `path` as tuples of cell values, header row first.
+    .xlsx files are streamed with openpyxl in read-only mode, so memory stays
+    flat however long the sheet is; .xls (or no openpyxl) goes through pandas.
+    Rows with no values at all are skipped, and blank header cells come out as ''.
+    """
+    if openpyxl is not None and not path.lower().endswith(".xls"):
+        wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = (r for r in wb.active.iter_rows(values_only=True)
+                    if any(v is not None and v != "" for v in r))
+            header = next(rows, None)
+            if header is None:
+                return
+            yield tuple("" if c is None else c for c in header)
+            yield from rows
+        finally:
+            wb.close()
+        return
+
+    if pd is None:
+        raise RuntimeError("Install openpyxl (or pandas) to read Excel files.")
+    df = pd.read_excel(path, dtype=object)
+    yield tuple(df.columns)
+    for row in df.itertuples(index=False, name=None):
+        if any(_plain(v) != "" for v in row):
+            yield row
+
+
+def iter_marks_messages(rows, cols, header):
+    """
+    Lazily turn data rows into (row_no, reg_no, name, phone, message) tuples using the
+    column positions detected once from the header. message is None when
+    the row has no phone number. row_no counts data rows from 1.
+    """
+    headers = [str(c).strip() for c in header]
+    pos = lambda col: headers.index(col) if col in headers else None
+    reg_i, name_i, phone_i = pos(cols["reg_col"]), pos(cols["name_col"]), pos(cols["phone_col"])
+    subjects = [(subj, pos(col)) for subj, col in cols["subjects"].items()]
+    template = templates().get("jarvis_marks")   # compiled once for the whole sheet
+
+    def cell(row, i):
+        return _plain(row[i]) if i is not None and i < len(row) else ""
+
+    for row_no, row in enumerate(rows, start=1):
+        reg_no, name, phone = cell(row, reg_i), cell(row, name_i), cell(row, phone_i)
+        if not str(phone).strip():
+            yield row_no, reg_no, name, phone, None
+            continue
+        marks = {subj: cell(row, i) for subj, i in subjects}
+        yield row_no, reg_no, name, phone, template.render(
+            {"whatsapp_no": phone, "reg_no": reg_no, "name": name, "marks": marks})
+
+
+def make_sender(channel):
+    """
+    (send, rate, concurrency) for a bulk send. 'desktop' opens pre-filled chats
+    through the whatsapp:// URI one at a time; 'api' sends through Twilio via
+    NotificationHandler (mock mode without credentials).
+    """
+    if channel == "api":
+        if NotificationHandler is None:
+            raise RuntimeError("The api channel needs the twilio package installed.")
+        handler = NotificationHandler(
+            account_sid=os.environ.get("TWILIO_ACCOUNT_SID"),
+            auth_token=os.environ.get("TWILIO_AUTH_TOKEN"),
+            from_number=os.environ.get("TWILIO_WHATSAPP_FROM"),
+            api_base_url=os.environ.get("TWILIO_API_BASE_URL"),
+        )
+
+        def send(number, message):
+            num = sanitize_number_for_wame(number)
+            if not num:
+                return False
+            return handler.deliver(f"+{num}", message)
+        return send, API_SEND_RATE, API_SEND_CONCURRENCY
+    return open_whatsapp_chat, 1.0 / SEND_DELAY_BETWEEN, 1
+
+
+def excel_row_count(path):
+    """Data rows in the first sheet as recorded in the workbook, or None if unknown."""
+    if openpyxl is None or path.lower().endswith(".xls"):
+        return None
+    try:
+        wb = openpyxl.load_workbook(path, read_only=True)
+        try:
+            rows = wb.active.max_row
+        finally:
+            wb.close()
+        return rows - 1 if rows else None
+    except Exception:
+        return None
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m" if hours else f"{minutes}m {seconds:02d}s"
+
+
+def send_marks_from_excel(path=None, gui_write=None, channel=None, fresh=False):
+    """
+    Read Excel and send each student's marks over WhatsApp (desktop chats or
+    the Twilio API). Progress is checkpointed per workbook, so running the
+    same file again only sends to students who weren't reached yet;
+    fresh=True starts over.
+    """
     def gw(text):
         if gui_write:
             gui_write("Jarvis", text)
         else:
             print(text)
 
-    if pd is None:
-        gw("pandas not installed. Please install pandas and openpyxl.")
+    if openpyxl is None and pd is None:
+        gw("openpyxl not installed. Please install openpyxl (or pandas).")
         return
 
     if not path:
@@ -185,16 +308,17 @@ def send_marks_from_excel(path=None, gui_write=None):
 
     gw(f"Reading Excel file: {path}")
     try:
-        df = pd.read_excel(path)
+        rows = iter_excel_rows(path)
+        header = next(rows, None)
     except Exception as e:
         gw(f"Failed to read Excel file: {e}")
         return
 
-    if df.empty:
+    if header is None:
         gw("Excel file is empty.")
         return
 
-    cols = detect_required_columns(df)
+    cols = detect_required_columns(header)
     reg_col = cols["reg_col"]
     name_col = cols["name_col"]
     phone_col = cols["phone_col"]
@@ -203,38 +327,78 @@ def send_marks_from_excel(path=None, gui_write=None):
     gw(f"Using columns -> REG: '{reg_col}', NAME: '{name_col}', PHONE: '{phone_col}'.")
     gw(f"Subjects: {list(subj_map.keys())}")
 
-    success, failed = 0, 0
-    for idx, row in df.iterrows():
-        try:
-            reg_no = row.get(reg_col, "")
-            name = row.get(name_col, "")
-            phone = row.get(phone_col, "")
-
-            marks = {}
-            for subj, col in subj_map.items():
-                val = row.get(col, "") if col and col in df.columns else ""
-                marks[subj] = "" if pd.isna(val) else val
+    channel = channel or SEND_CHANNEL
+    try:
+        send, rate, concurrency = make_sender(channel)
+    except Exception as e:
+        gw(str(e))
+        return
 
-            if not phone or str(phone).strip().lower() == "nan":
+    try:
+        job = SendJob(path, channel, directory=JOBS_DIR)
+    except Exception as e:
+        gw(f"Could not open the send checkpoint: {e}")
+        return
+    if fresh:
+        job.reset()
+    already_sent = job.sent_count()
+    if already_sent:
+        gw(f"Resuming an earlier send of this file: {already_sent} students already sent will be skipped.")
+
+    skipped, resumed = 0, 0
+
+    def jobs():
+        # Rows are read, turned into messages and handed to the dispatcher one
+        # at a time, so sending starts right away and memory doesn't grow with the sheet
+        nonlocal skipped, resumed
+        seen = set()
+        for idx, reg_no, name, phone, message in iter_marks_messages(rows, cols, header):
+            key = f"reg:{reg_no}" if str(reg_no).strip() else f"row:{idx}"
+            if key in seen:
+                gw(f"Skipping row {idx} ({name}) — same Reg No as an earlier row.")
+                skipped += 1
+                continue
+            seen.add(key)
+            if job.is_sent(key):
+                resumed += 1
+                continue
+            if message is None:
                 gw(f"Skipping row {idx} ({name}) — no phone number.")
-                failed += 1
+                skipped += 1
                 continue
+            yield (key, idx, name), phone, message
+
+    def on_result(key, phone, ok, error):
+        job.record(key[0], phone, ok, error)
+        # Successes only show up in the progress lines; failures are listed
+        if not ok:
+            _, idx, name = key
+            gw(f"Failed to send to {name} ({phone}), row {idx}: {error}")
+
+    def progress(done, total, failed, eta):
+        line = f"Progress: {done}/{total or '?'} sent, {failed} failed"
+        if eta is not None:
+            line += f", about {format_duration(eta)} left"
+        gw(line + ".")
+
+    dispatcher = Dispatcher(send, rate=rate, concurrency=concurrency, retries=SEND_RETRIES,
+                            on_result=on_result, progress=progress, progress_interval=PROGRESS_INTERVAL)
+    gw(f"Sending via {channel} at up to {rate:g} per second ({concurrency} at a time).")
+    total = excel_row_count(path)
+    try:
+        success, failed = dispatcher.run(jobs(), total=max(total - already_sent, 0) if total else None)
+    except Exception as e:
+        gw(f"Failed while reading Excel file: {e}")
+        return
+    finally:
+        job.close()
 
-            message = build_message_whatsapp_format(phone, reg_no, name, marks)
-            opened = open_whatsapp_chat(phone, message)
-            if opened:
-                gw(f"Opened WhatsApp chat for {name} ({phone}).")
-                success += 1
-            else:
-                gw(f"Failed to open WhatsApp for {name} ({phone}).")
-                failed += 1
-
-            time.sleep(SEND_DELAY_BETWEEN)
-        except Exception as e:
-            gw(f"Error processing row {idx}: {e}")
-            failed += 1
-
-    gw(f"Done. Opened chats for {success} students; {failed} failed/skipped.")
+    summary = f"Done. Sent to {success} students; {failed} failed, {skipped} skipped"
+    if resumed:
+        summary += f", {resumed} already sent earlier"
+    gw(summary + ".")
+    if failed:
+        gw("Run the same file again to retry the failed students only.")
 
 
 # ---------------- COMMAND HANDLER ----------------
@@ -250,8 +414,10 @@ def handle_command(cmd: str, gui_write=None):
         return f"Today's date is {datetime.now().strftime('%Y-%m-%d')}"
 
     if "send" in c and "marks" in c and "whatsapp" in c:
-        threading.Thread(target=send_marks_from_excel, args=(None, gui_write), daemon=True).start()
-        return "Preparing to open WhatsApp chats for student marks..."
+        channel = "api" if "api" in c else None
+        fresh = "again" in c or "resend" in c
+        threading.Thread(target=send_marks_from_excel, args=(None, gui_write, channel, fresh), daemon=True).start()
+        return "Preparing to send student marks on WhatsApp..."
 
     return "Sorry, I didn’t understand that."
 
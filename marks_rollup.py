@@ -0,0 +1,170 @@
+import math
+from collections import defaultdict
+from itertools import product
+import numpy as np
+import pandas as pd
+from stats import _to_number
+
+DIMENSIONS = ('subject', 'exam', 'department')
+BUCKET_WIDTH = 1        # marks per bucket kept in memory (percentile resolution)
+HISTOGRAM_WIDTH = 10    # marks per bucket in the histogram returned to clients
+
+
+def _label(value):
+    # Blank / NaN cells become '' so they can't collide with the ALL wildcard
+    if value is None or (isinstance(value, float) and value != value):
+        return ''
+    return str(value).strip()
+
+
+class Rollup:
+    """count / sum / min / max of a set of marks plus count and sum per bucket."""
+
+    __slots__ = ('count', 'total', 'min', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.buckets = defaultdict(lambda: [0, 0.0])     # floor(marks / BUCKET_WIDTH) -> [count, sum]
+
+    def add(self, marks):
+        self.merge(math.floor(marks / BUCKET_WIDTH), 1, marks, marks, marks)
+
+    def merge(self, bucket, count, total, low, high):
+        """Add `count` marks from one histogram bucket, summing to `total`."""
+        self.count += count
+        self.total += total
+        self.min = min(self.min, low)
+        self.max = max(self.max, high)
+        entry = self.buckets[bucket]
+        entry[0] += count
+        entry[1] += total
+
+    def percentile(self, p):
+        """
+        Interpolated between the two nearest ranks, like numpy's default,
+        with every mark represented by the mean of its bucket. Exact when all
+        marks in a bucket are equal (whole-number marks with BUCKET_WIDTH 1),
+        otherwise within one BUCKET_WIDTH.
+        """
+        if not self.count:
+            return None
+        position = p / 100 * (self.count - 1)
+        below = int(position)
+        fraction = position - below
+        target = below + 1 if fraction else below
+        low = high = None
+        seen = 0
+        for bucket in sorted(self.buckets):
+            n, total = self.buckets[bucket]
+            if not n:
+                continue
+            seen += n
+            if low is None and seen > below:
+                low = total / n
+            if seen > target:
+                high = total / n
+                break
+        return round(low + (high - low) * fraction, 2)
+
+    def histogram(self):
+        bins = defaultdict(int)
+        for bucket, (n, _) in self.buckets.items():
+            bins[math.floor(bucket * BUCKET_WIDTH / HISTOGRAM_WIDTH) * HISTOGRAM_WIDTH] += n
+        return [{"from": start, "to": start + HISTOGRAM_WIDTH, "count": bins[start]} for start in sorted(bins)]
+
+    def summary(self, histogram=False):
+        if not self.count:
+            return {"count": 0}
+        result = {
+            "count": self.count,
+            "mean": round(self.total / self.count, 2),
+            "min": self.min,
+            "max": self.max,
+            "p25": self.percentile(25),
+            "median": self.percentile(50),
+            "p75": self.percentile(75),
+            "p90": self.percentile(90),
+        }
+        if histogram:
+            result["histogram"] = self.histogram()
+        return result
+
+
+class MarksRollup:
+    """
+    Pre-aggregated numeric marks keyed by (Subject, Exam Name, Department).
+    Every mark is added to the Rollup of each of the 8 combinations of those
+    values and the ALL wildcard (None), so any filter on subject / exam /
+    department is one dictionary hit, and listing groups walks only the
+    groups, never the Marks Record rows. Built once from the sheets, then
+    kept up to date by DataManager as marks are added.
+
+    A mark counts under the student's department at the time it was added;
+    DataManager rebuilds the rollup when a student changes department.
+    """
+
+    def __init__(self, df_master, df_marks):
+        self.dept_of = dict(zip(df_master['Student ID'], df_master['Department']))
+        # mask (which dimensions are concrete) -> key -> Rollup
+        self.levels = {mask: defaultdict(Rollup) for mask in product((False, True), repeat=len(DIMENSIONS))}
+        self._load(df_marks)
+
+    def _load(self, df_marks):
+        # Collapse the sheet to one row per (subject, exam, department, bucket)
+        # first, so the Python loop below runs per group, not per mark
+        df = pd.DataFrame({
+            'subject': df_marks['Subject'].map(_label),
+            'exam': df_marks['Exam Name'].map(_label),
+            'department': df_marks['Student ID'].map(self.dept_of).map(_label),
+            'marks': pd.to_numeric(df_marks['Marks Obtained'], errors='coerce'),
+        }).dropna(subset=['marks'])
+        df['bucket'] = np.floor(df['marks'] / BUCKET_WIDTH).astype(int)
+        grouped = df.groupby(list(DIMENSIONS) + ['bucket'])['marks'].agg(['count', 'sum', 'min', 'max'])
+        for (*values, bucket), count, total, low, high in grouped.itertuples(name=None):
+            for mask, groups in self.levels.items():
+                key = tuple(v if concrete else None for v, concrete in zip(values, mask))
+                groups[key].merge(int(bucket), int(count), float(total), float(low), float(high))
+
+    def student_added(self, record):
+        self.dept_of[record['Student ID']] = record['Department']
+
+    def marks_added(self, records):
+        for r in records:
+            marks = _to_number(r['Marks Obtained'])
+            if marks is None:
+                continue
+            values = (_label(r['Subject']), _label(r['Exam Name']), _label(self.dept_of.get(r['Student ID'])))
+            for mask, groups in self.levels.items():
+                groups[tuple(v if concrete else None for v, concrete in zip(values, mask))].add(marks)
+
+    def query(self, subject=None, exam=None, department=None, group_by=(), histogram=False):
+        """
+        Summary of the marks matching the given filters (None = all), and with
+        group_by (a subset of DIMENSIONS) one summary per group, largest first.
+        """
+        filters = (subject, exam, department)
+        unknown = set(group_by) - set(DIMENSIONS)
+        if unknown:
+            raise ValueError(f"Unknown group_by: {', '.join(sorted(unknown))}. Use {', '.join(DIMENSIONS)}.")
+
+        key = tuple(_label(f) if f is not None else None for f in filters)
+        overall = self.levels[tuple(f is not None for f in filters)].get(key) or Rollup()
+        result = {
+            "filters": dict(zip(DIMENSIONS, filters)),
+            "summary": overall.summary(histogram),
+        }
+        if group_by:
+            mask = tuple(f is not None or d in group_by for f, d in zip(filters, DIMENSIONS))
+            groups = []
+            for group_key, rollup in self.levels[mask].items():
+                if any(f is not None and v != k for f, v, k in zip(filters, group_key, key)):
+                    continue
+                entry = {d: v for d, v in zip(DIMENSIONS, group_key) if d in group_by}
+                entry.update(rollup.summary(histogram))
+                groups.append(entry)
+            groups.sort(key=lambda g: (-g["count"], [str(g[d]) for d in group_by]))
+            result["groups"] = groups
+        return result
@@ -0,0 +1,103 @@
+import json
+import os
+import string
+import threading
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'message_templates.json')
+
+
+class _Values(dict):
+    """format_map mapping: missing placeholders and None render as ''."""
+
+    def __missing__(self, key):
+        return ''
+
+
+def _fields(fmt):
+    names = set()
+    for _, field, spec, conversion in string.Formatter().parse(fmt):
+        if field is None:
+            continue
+        # Plain names only: no positional fields, attribute or index lookups
+        if not field.isidentifier():
+            raise ValueError(f"Invalid placeholder {{{field}}} in template")
+        names.add(field)
+    return names
+
+
+class MessageTemplate:
+    """
+    One compiled message body. `body` is a str.format template; if `items`
+    names one of its placeholders, that placeholder is filled by rendering
+    `item` (with {key} and {value}) once per entry of the mapping passed
+    under that name, e.g. one line per subject. The format strings are
+    checked once here and rendered with str.format_map.
+    """
+
+    def __init__(self, name, body, items=None, item=None):
+        self.name = name
+        self.body = body
+        self.items = items
+        self.item = item
+        self.fields = _fields(body)
+        if items:
+            if items not in self.fields or not item:
+                raise ValueError(f"Template {name}: '{items}' must be a placeholder with an item format")
+            _fields(item)
+
+    def render(self, values):
+        values = _Values((k, '' if v is None else v) for k, v in values.items())
+        if self.items:
+            fmt = self.item.format_map
+            values[self.items] = ''.join(
+                fmt(_Values(key=k, value='' if v is None else v))
+                for k, v in (values.get(self.items) or {}).items())
+        return self.body.format_map(values)
+
+    def render_many(self, rows):
+        """Lazily render an iterable of value dicts, e.g. a whole class list."""
+        render = self.render
+        for values in rows:
+            yield render(values)
+
+
+class TemplateSet:
+    """Compiled templates by name and language, falling back to the default language."""
+
+    def __init__(self, config, language=None):
+        self.language = language or config.get('default_language', 'en')
+        self.templates = {}
+        for name, variants in config.get('templates', {}).items():
+            for lang, spec in variants.items():
+                self.templates[(name, lang)] = MessageTemplate(
+                    name, spec['body'], spec.get('items'), spec.get('item'))
+
+    def get(self, name, lang=None):
+        template = self.templates.get((name, lang or self.language)) or self.templates.get((name, self.language))
+        if template is None:
+            raise KeyError(f"No message template '{name}'")
+        return template
+
+    def render(self, name, values, lang=None):
+        return self.get(name, lang).render(values)
+
+
+def load_templates(path=None, language=None):
+    """TemplateSet from a JSON config file (MESSAGE_TEMPLATES, default message_templates.json)."""
+    path = path or os.environ.get('MESSAGE_TEMPLATES') or DEFAULT_PATH
+    with open(path, encoding='utf-8') as f:
+        return TemplateSet(json.load(f), language or os.environ.get('MESSAGE_LANGUAGE'))
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def templates():
+    """The process-wide TemplateSet, loaded and compiled on first use."""
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = load_templates()
+    return _shared
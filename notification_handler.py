@@ -1,10 +1,12 @@
 from twilio.rest import Client
+from message_templates import templates
 
 class NotificationHandler:
-    def __init__(self, account_sid=None, auth_token=None, from_number=None):
+    def __init__(self, account_sid=None, auth_token=None, from_number=None, api_base_url=None):
         """
         initializes the notification handler.
         For WhatsApp, from_number should be 'whatsapp:+1234567890' (Twilio sandbox number)
+        api_base_url points the Twilio client at another host, e.g. twilio_stub.py for testing.
         """
         self.account_sid = account_sid
         self.auth_token = auth_token
@@ -14,24 +16,41 @@ class NotificationHandler:
         if account_sid and auth_token:
             try:
                 self.client = Client(account_sid, auth_token)
+                if api_base_url:
+                    self.client.api.base_url = api_base_url.rstrip('/')
             except Exception as e:
                 print(f"Error initializing Twilio client: {e}")
 
+    @staticmethod
+    def absence_message(parent_name, student_name, date, reason, lang=None):
+        return templates().render('absence', {
+            'parent_name': parent_name, 'student_name': student_name, 'date': date, 'reason': reason,
+        }, lang)
+
+    @staticmethod
+    def marks_message(student_name, subject, exam, marks):
+        return NotificationHandler.marks_report_message(student_name, exam, {subject: marks})
+
+    @staticmethod
+    def marks_report_message(student_name, exam, marks, reg_no='-', lang=None):
+        """One message with every subject's marks for an exam; marks maps subject -> marks."""
+        return templates().render('marks_report', {
+            'student_name': student_name, 'exam': exam, 'marks': marks, 'reg_no': reg_no,
+        }, lang)
+
     def send_absence_notification(self, parent_name, student_name, parent_phone, date, reason):
-        message_body = f"Dear Parent {parent_name}, your child {student_name} is absent today ({date}). Reason: {reason}. Please contact the college if needed."
+        message_body = self.absence_message(parent_name, student_name, date, reason)
         return self._send_whatsapp(parent_phone, message_body)
 
     def send_marks_notification(self, parent_name, student_name, parent_phone, subject, exam, marks):
-        message_body = (
-            f"Dear Parent :  The Following is the {exam} Marks Secured in each Course by your son/daughter\n"
-            f"REGISTER NUMBER :  -\n"
-            f"NAME :{student_name}\n"
-            f"{subject} :\t{marks}\n"
-            f"\nRegards\nPRINCIPAL\nRMKCET"
-        )
+        message_body = self.marks_message(student_name, subject, exam, marks)
         return self._send_whatsapp(parent_phone, message_body)
 
-    def _send_whatsapp(self, to_number, body):
+    def deliver(self, to_number, body):
+        """
+        Send one WhatsApp message and return its SID (None in mock mode).
+        Raises on failure so callers such as NotificationQueue can retry.
+        """
         # Format number for WhatsApp if not already formatted
         if not to_number.startswith('whatsapp:'):
             to_whatsapp = f"whatsapp:{to_number}"
@@ -39,22 +58,28 @@ class NotificationHandler:
             to_whatsapp = to_number
 
         if self.client and self.from_number:
-            try:
-                # Ensure from_number also starts with whatsapp:
-                from_whatsapp = self.from_number if self.from_number.startswith('whatsapp:') else f"whatsapp:{self.from_number}"
-                
-                message = self.client.messages.create(
-                    body=body,
-                    from_=from_whatsapp,
-                    to=to_whatsapp
-                )
-                return True, f"WhatsApp sent (SID: {message.sid})"
-            except Exception as e:
-                return False, f"Twilio Error: {str(e)}"
+            # Ensure from_number also starts with whatsapp:
+            from_whatsapp = self.from_number if self.from_number.startswith('whatsapp:') else f"whatsapp:{self.from_number}"
+            
+            message = self.client.messages.create(
+                body=body,
+                from_=from_whatsapp,
+                to=to_whatsapp
+            )
+            return message.sid
         else:
             # Mock mode for demonstration
             print(f"--- MOCK WHATSAPP SENT ---")
             print(f"To: {to_whatsapp}")
             print(f"Body: {body}")
             print(f"--------------------------")
+            return None
+
+    def _send_whatsapp(self, to_number, body):
+        try:
+            sid = self.deliver(to_number, body)
+        except Exception as e:
+            return False, f"Twilio Error: {str(e)}"
+        if sid is None:
             return True, "WhatsApp sent (Mock Mode)"
+        return True, f"WhatsApp sent (SID: {sid})"
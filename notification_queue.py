@@ -0,0 +1,263 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+
+
+class NotificationQueue:
+    """
+    Durable outbound WhatsApp queue. Messages are stored in a SQLite outbox and
+    drained by a pool of worker threads, so callers get a ticket back right away
+    instead of waiting on Twilio. Failed sends are retried with exponential
+    backoff; every message keeps its status, attempt count, last error and SID.
+
+    Several processes (e.g. gunicorn workers) can share one outbox: a message is
+    claimed with a lease, and a lease that expires (crashed worker) makes the
+    message available again.
+
+    A message can carry a dedupe_key (queued at most once per key), or a
+    coalesce_key: parts added under the same key while the message is still
+    waiting are merged into it and its body re-rendered (see enqueue_coalesced).
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS outbox (
+            ticket TEXT PRIMARY KEY,
+            kind TEXT,
+            to_number TEXT NOT NULL,
+            body TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt REAL NOT NULL,
+            lease_until REAL,
+            sid TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            dedupe_key TEXT,
+            coalesce_key TEXT
+        );
+        CREATE TABLE IF NOT EXISTS outbox_parts (
+            ticket TEXT NOT NULL,
+            part TEXT NOT NULL,
+            value TEXT,
+            PRIMARY KEY (ticket, part)
+        );
+    """
+
+    INDEXES = """
+        CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt);
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_outbox_dedupe ON outbox (dedupe_key);
+        CREATE INDEX IF NOT EXISTS idx_outbox_coalesce ON outbox (coalesce_key, status);
+    """
+
+    def __init__(self, handler, db_path='notifications.db', workers=2,
+                 max_attempts=5, backoff=2.0, lease=60.0, poll_interval=1.0, metrics=None):
+        self.handler = handler
+        self.metrics = metrics
+        self.db_path = db_path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._threads = []
+        with closing(self._connect()) as conn:
+            conn.executescript(self.SCHEMA)
+            # Outboxes created before dedupe/coalescing existed
+            columns = {r['name'] for r in conn.execute('PRAGMA table_info(outbox)')}
+            for column in ('dedupe_key', 'coalesce_key'):
+                if column not in columns:
+                    conn.execute(f'ALTER TABLE outbox ADD COLUMN {column} TEXT')
+            conn.executescript(self.INDEXES)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # ---------------- producer side ----------------
+    def enqueue(self, to_number, body, kind='', dedupe_key=None):
+        return self.enqueue_many([(to_number, body)], kind, [dedupe_key])[0]
+
+    def enqueue_many(self, messages, kind='', dedupe_keys=None):
+        """
+        Queue (to_number, body) pairs in one transaction. Returns their tickets.
+        A message whose dedupe key was already queued is dropped, and the
+        earlier message's ticket is returned for it.
+        """
+        now = time.time()
+        dedupe_keys = dedupe_keys or [None] * len(messages)
+        tickets = []
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for (to, body), key in zip(messages, dedupe_keys):
+                    ticket = uuid.uuid4().hex
+                    inserted = conn.execute(
+                        'INSERT INTO outbox (ticket, kind, to_number, body, next_attempt, created_at, updated_at, '
+                        'dedupe_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (dedupe_key) DO NOTHING',
+                        (ticket, kind, str(to), body, now, now, now, key)).rowcount
+                    if not inserted:
+                        ticket = conn.execute('SELECT ticket FROM outbox WHERE dedupe_key = ?', (key,)).fetchone()[0]
+                    tickets.append(ticket)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        self._wake.set()
+        return tickets
+
+    def enqueue_coalesced(self, to_number, coalesce_key, part, value, render, window, kind=''):
+        """
+        Add one part (e.g. one subject's marks) to the message waiting under
+        coalesce_key, or start a new one that waits `window` seconds for more
+        parts. The body is re-rendered as render(parts) each time, where parts
+        maps part -> value in the order the parts arrived; re-adding a part
+        replaces its value. Once a worker has picked the message up, the
+        next part starts a new message. Returns the ticket.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute(
+                    "SELECT ticket FROM outbox WHERE coalesce_key = ? AND status = 'queued'",
+                    (coalesce_key,)).fetchone()
+                if row:
+                    ticket = row['ticket']
+                else:
+                    ticket = uuid.uuid4().hex
+                    conn.execute(
+                        'INSERT INTO outbox (ticket, kind, to_number, body, next_attempt, created_at, updated_at, '
+                        "coalesce_key) VALUES (?, ?, ?, '', ?, ?, ?, ?)",
+                        (ticket, kind, str(to_number), now + window, now, now, coalesce_key))
+                conn.execute(
+                    'INSERT INTO outbox_parts (ticket, part, value) VALUES (?, ?, ?) '
+                    'ON CONFLICT (ticket, part) DO UPDATE SET value = excluded.value',
+                    (ticket, str(part), json.dumps(value, default=str)))
+                parts = {r['part']: json.loads(r['value']) for r in conn.execute(
+                    'SELECT part, value FROM outbox_parts WHERE ticket = ? ORDER BY rowid', (ticket,))}
+                conn.execute(
+                    'UPDATE outbox SET to_number = ?, body = ?, updated_at = ? WHERE ticket = ?',
+                    (str(to_number), render(parts), now, ticket))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return ticket
+
+    def release_coalesced(self):
+        """
+        Make every message still waiting for more parts due now, e.g. before
+        shutting down, so it isn't held until the next start. Returns how many.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            released = conn.execute(
+                "UPDATE outbox SET next_attempt = ?, updated_at = ? "
+                "WHERE status = 'queued' AND attempts = 0 AND coalesce_key IS NOT NULL AND next_attempt > ?",
+                (now, now, now)).rowcount
+        self._wake.set()
+        return released
+
+    def drain(self, timeout=10.0):
+        """
+        Wait until no message is due or being sent (retries scheduled later
+        don't count), for at most `timeout` seconds. Returns True if drained.
+        """
+        deadline = time.monotonic() + timeout
+        with closing(self._connect()) as conn:
+            while True:
+                pending = conn.execute(
+                    "SELECT COUNT(*) FROM outbox WHERE status IN ('queued', 'sending') AND next_attempt <= ?",
+                    (time.time(),)).fetchone()[0]
+                if not pending:
+                    return True
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.1)
+
+    def get(self, ticket):
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                'SELECT ticket, kind, to_number, status, attempts, sid, error, created_at, updated_at '
+                'FROM outbox WHERE ticket = ?', (ticket,)).fetchone()
+        return dict(row) if row else None
+
+    # ---------------- worker side ----------------
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"notify-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self, timeout=5):
+        self._stopped.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def _claim(self, conn):
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                "SELECT ticket, kind, to_number, body, attempts FROM outbox "
+                "WHERE (status = 'queued' AND next_attempt <= ?) OR (status = 'sending' AND lease_until < ?) "
+                "ORDER BY next_attempt LIMIT 1", (now, now)).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE outbox SET status = 'sending', lease_until = ?, updated_at = ? WHERE ticket = ?",
+                    (now + self.lease, now, row['ticket']))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return row
+
+    def _work(self):
+        conn = self._connect()
+        while not self._stopped.is_set():
+            self._wake.clear()
+            try:
+                row = self._claim(conn)
+            except sqlite3.OperationalError as e:
+                print(f"Notification queue busy: {e}")
+                row = None
+            if row is None:
+                self._wake.wait(self.poll_interval)
+                continue
+            self._deliver(conn, row)
+        conn.close()
+
+    def _deliver(self, conn, row):
+        attempts = row['attempts'] + 1
+        start = time.perf_counter()
+        try:
+            sid = self.handler.deliver(row['to_number'], row['body'])
+            if self.metrics:
+                self.metrics.observe_send(row['kind'], 'sent', time.perf_counter() - start)
+            conn.execute(
+                "UPDATE outbox SET status = 'sent', attempts = ?, sid = ?, error = NULL, "
+                "lease_until = NULL, updated_at = ? WHERE ticket = ?",
+                (attempts, sid, time.time(), row['ticket']))
+        except Exception as e:
+            if self.metrics:
+                self.metrics.observe_send(row['kind'], 'error', time.perf_counter() - start)
+            now = time.time()
+            if attempts >= self.max_attempts:
+                status, next_attempt = 'failed', now
+            else:
+                status, next_attempt = 'queued', now + self.backoff ** attempts
+            conn.execute(
+                "UPDATE outbox SET status = ?, attempts = ?, error = ?, next_attempt = ?, "
+                "lease_until = NULL, updated_at = ? WHERE ticket = ?",
+                (status, attempts, str(e), next_attempt, now, row['ticket']))
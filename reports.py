@@ -0,0 +1,40 @@
+import pandas as pd
+
+SHORTAGE_THRESHOLD = 75.0
+
+REPORT_COLUMNS = ['Student ID', 'Name', 'Department', 'Days Recorded', 'Days Present',
+                  'Days Absent', 'Attendance %', 'Shortage']
+
+
+def attendance_report(df_students, df_attendance, threshold=SHORTAGE_THRESHOLD):
+    """
+    Per-student attendance percentage over df_attendance (Daily Attendance and
+    Attendance History rows already combined and filtered to the date range),
+    in one groupby. Every student in df_students gets a row; students with no
+    records have no percentage and are never flagged. Shortage is True when
+    the percentage is below threshold.
+    """
+    status = df_attendance['Attendance Status']
+    counts = pd.DataFrame({
+        'Student ID': df_attendance['Student ID'],
+        'Days Present': status.eq('Present').astype('int64'),
+        'Days Absent': status.eq('Absent').astype('int64'),
+    }).groupby('Student ID', sort=False).sum()
+    counts['Days Recorded'] = counts['Days Present'] + counts['Days Absent']
+
+    report = df_students[['Student ID', 'Name', 'Department']].merge(
+        counts, left_on='Student ID', right_index=True, how='left')
+    for col in ('Days Recorded', 'Days Present', 'Days Absent'):
+        report[col] = report[col].fillna(0).astype('int64')
+
+    recorded = report['Days Recorded'].where(report['Days Recorded'] > 0)
+    report['Attendance %'] = (report['Days Present'] / recorded * 100).round(2)
+    report['Shortage'] = report['Attendance %'] < threshold
+    return report[REPORT_COLUMNS].reset_index(drop=True)
+
+
+def iter_csv(df, chunk_size=1000):
+    """Yield df as CSV text a chunk of rows at a time, header first."""
+    yield df.iloc[:0].to_csv(index=False)
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start + chunk_size].to_csv(header=False, index=False)
@@ -1,75 +1,241 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, send_file, stream_with_context
 from flask_cors import CORS
 from data_manager import DataManager
 from notification_handler import NotificationHandler
+from notification_queue import NotificationQueue
+from coalescing_notifier import CoalescingNotifier
+from http_cache import JSONResponseCache
+from importer import IMPORTERS
+from instrumentation import Metrics, SlowRequestProfiler, instrument, phase
+from reports import SHORTAGE_THRESHOLD, iter_csv
+from storage import SHEET_COLUMNS, normalize_date
+from student_index import decode_cursor, encode_cursor
 from datetime import datetime
-import pandas as pd
 import os
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for the web frontend
 
-db = DataManager()
-notifier = NotificationHandler()
+# Opt-in instrumentation: ENABLE_METRICS=1 adds latency histograms and
+# GET /api/metrics; PROFILE_SLOW_MS=<ms> keeps cProfile dumps of slow requests.
+# Either one also turns on per-phase Server-Timing headers.
+metrics = Metrics() if os.environ.get('ENABLE_METRICS') == '1' else None
+profiler = None
+if os.environ.get('PROFILE_SLOW_MS'):
+    profiler = SlowRequestProfiler(
+        directory=os.environ.get('PROFILE_DIR', 'profiles'),
+        threshold_ms=float(os.environ['PROFILE_SLOW_MS']),
+        sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', '1')),
+    )
+if metrics or profiler:
+    instrument(app, metrics, profiler)
+
+db = DataManager(
+    backend=os.environ.get('ATTENDANCE_BACKEND', 'sqlite'),
+    flush_interval=float(os.environ.get('EXCEL_FLUSH_INTERVAL', '5')),
+)
+notifier = NotificationHandler(
+    account_sid=os.environ.get('TWILIO_ACCOUNT_SID'),
+    auth_token=os.environ.get('TWILIO_AUTH_TOKEN'),
+    from_number=os.environ.get('TWILIO_WHATSAPP_FROM'),
+    api_base_url=os.environ.get('TWILIO_API_BASE_URL'),
+)
+# WhatsApp sends go through a durable outbox drained by background workers,
+# so requests return a ticket instead of waiting on Twilio.
+outbox = NotificationQueue(
+    notifier,
+    db_path=os.environ.get('NOTIFY_QUEUE_PATH', 'notifications.db'),
+    workers=int(os.environ.get('NOTIFY_WORKERS', '2')),
+    max_attempts=int(os.environ.get('NOTIFY_MAX_ATTEMPTS', '5')),
+    metrics=metrics,
+).start()
+# Marks for one student and exam are collected for MARKS_COALESCE_WINDOW seconds
+# and sent as one report; absence alerts go out once per student per day.
+alerts = CoalescingNotifier(outbox, notifier, window=float(os.environ.get('MARKS_COALESCE_WINDOW', '120')))
+# Serialized bodies of the polled read endpoints, reused until the data changes
+responses = JSONResponseCache(db.version)
 
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
     try:
-        df_students = db.get_all_students()
-        total_students = len(df_students)
-        
+        # Counters are maintained incrementally by DataManager; this is O(1)
         date_str = datetime.now().strftime('%Y-%m-%d')
-        df_daily = pd.read_excel(db.file_path, sheet_name='Daily Attendance')
-        
-        present_today = len(df_daily[(df_daily['Date'] == date_str) & (df_daily['Attendance Status'] == 'Present')])
-        absent_today = len(df_daily[(df_daily['Date'] == date_str) & (df_daily['Attendance Status'] == 'Absent')])
-        
-        # Calculate Avg Performance (Mocking actual calculation logic from Marks Record)
-        df_marks = pd.read_excel(db.file_path, sheet_name='Marks Record')
-        if not df_marks.empty:
-            avg_marks = f"{round(pd.to_numeric(df_marks['Marks Obtained'], errors='coerce').mean(), 1)}%"
-        else:
-            avg_marks = "0%"
-
-        return jsonify({
-            "total_students": total_students,
-            "present_today": present_today,
-            "absent_today": absent_today,
-            "avg_marks": avg_marks
-        })
+        return responses.respond(('stats', date_str), lambda: db.stats().snapshot(date_str))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/analytics/marks', methods=['GET'])
+def get_marks_analytics():
+    """
+    Marks statistics (count, mean, min, max, percentiles) filtered by
+    subject=, exam= and dept=, optionally split with group_by=subject,exam,dept
+    and with histogram=1. Served from pre-aggregated rollups.
+    """
+    subject = request.args.get('subject') or None
+    exam = request.args.get('exam') or None
+    dept = request.args.get('dept') or None
+    group_by = tuple(g.strip() for g in request.args.get('group_by', '').split(',') if g.strip())
+    group_by = tuple('department' if g == 'dept' else g for g in group_by)
+    histogram = request.args.get('histogram') in ('1', 'true')
+    try:
+        key = ('analytics', subject, exam, dept, group_by, histogram)
+        return responses.respond(key, lambda: db.marks_rollup().query(subject, exam, dept, group_by, histogram))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/attendance/today', methods=['GET'])
 def get_today_attendance():
     try:
+        dept = request.args.get('dept')
+        # Optional pagination: ?page=1&per_page=100 (total count in X-Total-Count)
+        page = request.args.get('page', type=int)
+        per_page = request.args.get('per_page', type=int)
+        if page or per_page:
+            page = max(page or 1, 1)
+            per_page = max(per_page or 100, 1)
+
+        def build():
+            df = db.get_today_attendance(dept=dept)
+            total = len(df)
+            if page:
+                df = df.iloc[(page - 1) * per_page: page * per_page]
+            return df.to_dict(orient='records'), {'X-Total-Count': str(total)}
+
         date_str = datetime.now().strftime('%Y-%m-%d')
-        df_students = db.get_all_students()
-        df_daily = pd.read_excel(db.file_path, sheet_name='Daily Attendance')
-        
-        # Merge students with their today's attendance
-        df_today = df_daily[df_daily['Date'] == date_str]
-        
-        # Combine
-        records = []
-        for _, s in df_students.iterrows():
-            att = df_today[df_today['Student ID'].astype(str) == str(s['Student ID'])]
-            records.append({
-                "Student ID": s['Student ID'],
-                "Name": s['Name'],
-                "Status": att.iloc[0]['Attendance Status'] if not att.empty else "Pending"
+        return responses.respond(('attendance/today', date_str, dept, page, per_page), build)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def date_range_args():
+    """?from= and ?to= as YYYY-MM-DD (None if absent). Raises ValueError for anything else."""
+    return normalize_date(request.args.get('from') or None), normalize_date(request.args.get('to') or None)
+
+@app.route('/api/attendance/history', methods=['GET'])
+def get_attendance_history():
+    try:
+        from_date, to_date = date_range_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        with phase('compute'):
+            df = db.get_attendance_history(
+                from_date=from_date,
+                to_date=to_date,
+                student_id=request.args.get('student_id')
+            )
+        with phase('serialize'):
+            return jsonify(df.to_dict(orient='records'))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/reports/attendance', methods=['GET'])
+def get_attendance_report():
+    try:
+        from_date, to_date = date_range_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        with phase('compute'):
+            df = db.attendance_report(
+                from_date=from_date,
+                to_date=to_date,
+                dept=request.args.get('dept'),
+                threshold=request.args.get('threshold', SHORTAGE_THRESHOLD, type=float)
+            )
+            if request.args.get('shortage_only') == '1':
+                df = df[df['Shortage']]
+
+        if request.args.get('format') == 'csv':
+            # Stream the rows out in chunks instead of building one huge body
+            return Response(
+                stream_with_context(iter_csv(df)),
+                mimetype='text/csv',
+                headers={'Content-Disposition': 'attachment; filename=attendance_report.csv'}
+            )
+
+        with phase('serialize'):
+            return jsonify({
+                "from": from_date,
+                "to": to_date,
+                "shortage_count": int(df['Shortage'].sum()),
+                "students": df.astype(object).where(df.notna(), None).to_dict(orient='records')
             })
-            
-        return jsonify(records)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/students', methods=['GET'])
 def get_students():
     try:
-        df = db.get_all_students()
-        students = df.to_dict(orient='records')
-        return jsonify(students)
+        # ?dept= &id_prefix= &name_prefix= filter, ?fields=Student ID,Name projects,
+        # ?limit= &cursor= page (next page's cursor in X-Next-Cursor)
+        args = request.args
+        fields = [f.strip() for f in args['fields'].split(',')] if args.get('fields') else None
+        unknown = set(fields or ()) - set(SHEET_COLUMNS['Student Master'])
+        if unknown:
+            return jsonify({"error": f"Unknown fields: {', '.join(sorted(unknown))}"}), 400
+        limit = args.get('limit', type=int)
+        after = decode_cursor(args['cursor']) if args.get('cursor') else None
+
+        def build():
+            rows, cursor = db.students().page(
+                dept=args.get('dept'),
+                id_prefix=args.get('id_prefix'),
+                name_prefix=args.get('name_prefix'),
+                after=after,
+                limit=max(limit, 1) if limit else None,
+            )
+            if fields:
+                rows = [{f: r[f] for f in fields} for r in rows]
+            return rows, {'X-Next-Cursor': encode_cursor(cursor)} if cursor else {}
+
+        key = ('students', args.get('dept'), args.get('id_prefix'), args.get('name_prefix'),
+               tuple(fields or ()), after, limit)
+        return responses.respond(key, build)
+    except ValueError as e:  # bad cursor
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/students/<student_id>/attendance', methods=['GET'])
+def get_student_attendance(student_id):
+    """
+    One student's attendance timeline, archived and current, between from=
+    and to= (inclusive, YYYY-MM-DD), with Present/Absent totals.
+    """
+    try:
+        from_date, to_date = date_range_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        student = db.get_student_parent_info(student_id)
+        if student is None:
+            return jsonify({"error": "Student not found"}), 404
+        sid = student['Student ID']
+
+        def build():
+            df = db.student_attendance(sid, from_date, to_date)
+            status = df['Attendance Status']
+            return {
+                "student_id": sid,
+                "name": student['Name'],
+                "from": from_date,
+                "to": to_date,
+                "present": int(status.eq('Present').sum()),
+                "absent": int(status.eq('Absent').sum()),
+                "records": df.where(df.notna(), None).to_dict(orient='records'),
+            }
+
+        return responses.respond(('student_attendance', sid, from_date, to_date), build)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/export', methods=['GET'])
+def export_workbook():
+    try:
+        path = db.export_excel(os.path.splitext(db.file_path)[0] + '_export.xlsx')
+        return send_file(os.path.abspath(path), as_attachment=True, download_name='attendance.xlsx')
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -80,20 +246,52 @@ def mark_attendance():
     status = data.get('status')
     reason = data.get('reason', '')
     
-    success, msg = db.mark_attendance(student_id, status, reason)
+    with phase('compute'):
+        success, msg = db.mark_attendance(student_id, status, reason)
     
+    ticket = None
     if success and status == 'Absent':
         student_info = db.get_student_parent_info(student_id)
         if student_info:
-            notifier.send_absence_notification(
-                student_info['Parent Name'],
-                student_info['Name'],
-                str(student_info['Parent Phone Number']),
-                datetime.now().strftime('%Y-%m-%d'),
-                reason
-            )
+            with phase('notify'):
+                ticket = alerts.absence(student_info, datetime.now().strftime('%Y-%m-%d'), reason)
             
-    return jsonify({"success": success, "message": msg})
+    return jsonify({"success": success, "message": msg, "ticket": ticket})
+
+@app.route('/api/attendance/bulk', methods=['POST'])
+def mark_attendance_bulk():
+    data = request.json
+    entries = data.get('records', []) if isinstance(data, dict) else data
+    if not isinstance(entries, list):
+        return jsonify({"success": False, "message": "Expected a list of attendance records."}), 400
+
+    with phase('compute'):
+        results = db.mark_attendance_bulk(entries)
+
+    date_str = datetime.now().strftime('%Y-%m-%d')
+    notified = []
+    messages = []
+    for r in results:
+        if r['success'] and r['status'] == 'Absent':
+            student_info = db.get_student_parent_info(r['student_id'])
+            if student_info:
+                notified.append(r)
+                messages.append((student_info, date_str, r['reason']))
+    # Queue the whole batch of absence alerts in one transaction
+    if messages:
+        with phase('notify'):
+            tickets = alerts.absences(messages)
+        for r, ticket in zip(notified, tickets):
+            r['ticket'] = ticket
+
+    marked = sum(1 for r in results if r['success'])
+    return jsonify({
+        "success": marked > 0,
+        "marked": marked,
+        "skipped": len(results) - marked,
+        "notifications": len(messages),
+        "results": results
+    })
 
 @app.route('/api/marks', methods=['POST'])
 def add_marks():
@@ -103,21 +301,47 @@ def add_marks():
     exam = data.get('exam')
     marks = data.get('marks')
     
-    success, msg = db.add_marks(student_id, subject, exam, marks)
+    with phase('compute'):
+        success, msg = db.add_marks(student_id, subject, exam, marks)
     
+    ticket = None
     if success:
         student_info = db.get_student_parent_info(student_id)
         if student_info:
-            notifier.send_marks_notification(
-                student_info['Parent Name'],
-                student_info['Name'],
-                str(student_info['Parent Phone Number']),
-                subject,
-                exam,
-                marks
-            )
+            with phase('notify'):
+                # Same ticket for every subject of this exam until the report goes out
+                ticket = alerts.marks(student_info, subject, exam, marks)
             
-    return jsonify({"success": success, "message": msg})
+    return jsonify({"success": success, "message": msg, "ticket": ticket})
+
+@app.route('/api/import/<kind>', methods=['POST'])
+def import_file(kind):
+    """
+    Bulk import of a roster (kind=students) or marks sheet (kind=marks) sent
+    as a multipart 'file' upload (CSV or Excel). Valid rows are written in one
+    commit; the response lists every rejected row. ?dry_run=1 only validates.
+    """
+    if kind not in IMPORTERS:
+        return jsonify({"error": f"Unknown import type: {kind}"}), 404
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({"success": False, "message": "Upload the file as multipart field 'file'."}), 400
+    dry_run = request.args.get('dry_run') in ('1', 'true')
+    try:
+        with phase('compute'):
+            report = IMPORTERS[kind](db, upload.stream, upload.filename, dry_run=dry_run)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    return jsonify(dict(report, success=report['imported'] > 0))
+
+@app.route('/api/notifications/<ticket>', methods=['GET'])
+def get_notification(ticket):
+    message = outbox.get(ticket)
+    if message is None:
+        return jsonify({"error": "Unknown ticket"}), 404
+    return jsonify(message)
 
 if __name__ == '__main__':
     # Run on all interfaces so the APK can connect via IP
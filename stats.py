@@ -0,0 +1,92 @@
+from collections import defaultdict
+
+
+def _to_number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if number != number else number  # NaN
+
+
+class StatsAggregator:
+    """
+    Running counters behind the dashboard: students per department, present /
+    absent per date (and per date + department) in Daily Attendance, and the
+    sum / count of numeric marks. Built once from the sheets, then kept up to
+    date by DataManager as each write commits, so reading them is O(1).
+    """
+
+    def __init__(self, df_master, df_daily, df_marks):
+        self.dept_of = dict(zip(df_master['Student ID'], df_master['Department']))
+        self.students = defaultdict(int)
+        for dept in self.dept_of.values():
+            self.students[dept] += 1
+
+        self.attendance = defaultdict(lambda: defaultdict(int))       # date -> status -> n
+        self.attendance_dept = defaultdict(lambda: defaultdict(int))  # (date, dept) -> status -> n
+        self.attendance_marked(df_daily.to_dict(orient='records'))
+
+        self.marks_sum = 0.0
+        self.marks_count = 0
+        self.dept_marks_sum = defaultdict(float)   # dept -> sum
+        self.dept_marks_count = defaultdict(int)
+        self.marks_added(df_marks.to_dict(orient='records'))
+
+    # ---------------- updates ----------------
+    def student_added(self, record):
+        if record['Student ID'] in self.dept_of:
+            self.students[self.dept_of[record['Student ID']]] -= 1
+        self.dept_of[record['Student ID']] = record['Department']
+        self.students[record['Department']] += 1
+
+    def attendance_marked(self, records):
+        for r in records:
+            dept = self.dept_of.get(r['Student ID'])
+            self.attendance[r['Date']][r['Attendance Status']] += 1
+            self.attendance_dept[(r['Date'], dept)][r['Attendance Status']] += 1
+
+    def marks_added(self, records):
+        for r in records:
+            marks = _to_number(r['Marks Obtained'])
+            if marks is None:
+                continue
+            # Kept apart from the per-department sums: a student with no
+            # department (or not on the roster) must still count only once
+            self.marks_sum += marks
+            self.marks_count += 1
+            dept = self.dept_of.get(r['Student ID'])
+            self.dept_marks_sum[dept] += marks
+            self.dept_marks_count[dept] += 1
+
+    def daily_archived(self):
+        self.attendance.clear()
+        self.attendance_dept.clear()
+
+    # ---------------- reads ----------------
+    @staticmethod
+    def _avg_marks(total, count):
+        if not count:
+            return "0%"
+        return f"{round(total / count, 1)}%"
+
+    def snapshot(self, date_str):
+        today = self.attendance.get(date_str, {})
+        by_department = {}
+        for dept, count in self.students.items():
+            if not count:
+                continue
+            dept_today = self.attendance_dept.get((date_str, dept), {})
+            by_department[str(dept)] = {
+                "total_students": count,
+                "present_today": dept_today.get('Present', 0),
+                "absent_today": dept_today.get('Absent', 0),
+                "avg_marks": self._avg_marks(self.dept_marks_sum.get(dept, 0.0), self.dept_marks_count.get(dept, 0)),
+            }
+        return {
+            "total_students": len(self.dept_of),
+            "present_today": today.get('Present', 0),
+            "absent_today": today.get('Absent', 0),
+            "avg_marks": self._avg_marks(self.marks_sum, self.marks_count),
+            "by_department": by_department,
+        }
@@ -0,0 +1,624 @@
+import atexit
+import math
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+import pandas as pd
+from file_lock import FileLock
+from instrumentation import phase
+
+ATTENDANCE_STATUSES = ('Present', 'Absent')
+
+# Declared column types of the four logical sheets. Every backend stores the
+# same sheets; the Excel workbook uses them as sheet names, SQLite as tables.
+#   id        canonical Student ID string (see normalize_student_id)
+#   text      str; a number typed into Excel (e.g. a phone number) becomes '9876543210'
+#   category  pandas category: a few values repeated on many rows
+#   status    category, and only ATTENDANCE_STATUSES may be written
+#   date      'YYYY-MM-DD' str, which sorts and compares like the date itself
+#   number    float64, NaN when blank
+# apply_schema() gives a loaded frame these types once; coerce_record()
+# converts (or rejects) each record before a backend writes it.
+_ATTENDANCE_SCHEMA = {'Date': 'date', 'Student ID': 'id', 'Attendance Status': 'status', 'Reason for Leave': 'text'}
+SHEET_SCHEMA = {
+    'Student Master': {'Student ID': 'id', 'Name': 'text', 'Department': 'category',
+                       'Parent Name': 'text', 'Parent Phone Number': 'text'},
+    'Daily Attendance': _ATTENDANCE_SCHEMA,
+    'Attendance History': _ATTENDANCE_SCHEMA,
+    'Marks Record': {'Student ID': 'id', 'Subject': 'text', 'Exam Name': 'text', 'Marks Obtained': 'number'},
+}
+SHEET_COLUMNS = {sheet: list(schema) for sheet, schema in SHEET_SCHEMA.items()}
+
+_ISO_DATE = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+
+def _is_blank(value):
+    return value is None or (not isinstance(value, str) and pd.isna(value))
+
+
+def normalize_text(value):
+    """A cell as stripped text; Excel's 9876543210.0 becomes '9876543210'. Blanks are None."""
+    if _is_blank(value):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def normalize_student_id(value):
+    """
+    Canonical form of a Student ID: a stripped string. Excel hands back 101,
+    101.0 or "101 " for the same student, all of which become "101".
+    """
+    return normalize_text(value)
+
+
+def normalize_student_ids(series):
+    """normalize_student_id over a whole column (done once per load, not per lookup)."""
+    return series.map(normalize_student_id, na_action='ignore').astype(object)
+
+
+def normalize_date(value):
+    """A date, timestamp or date string as 'YYYY-MM-DD'. Raises ValueError if it isn't a date."""
+    if _is_blank(value):
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if _ISO_DATE.fullmatch(value):
+            return value
+    try:
+        return pd.Timestamp(value).strftime('%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid date: {value!r}") from None
+
+
+def _loaded_date(value):
+    # Keep what can't be parsed rather than losing rows that are already stored
+    try:
+        return normalize_date(value)
+    except ValueError:
+        return normalize_text(value)
+
+
+def _map_unique(series, convert):
+    # Dates and departments repeat on many rows: convert each distinct value once
+    uniques = series.dropna().unique()
+    return series.map(dict(zip(uniques, map(convert, uniques)))).astype(object)
+
+
+def apply_schema(sheet, df, clean=True):
+    """
+    df with the sheet's declared column types (SHEET_SCHEMA). clean=True also
+    normalises the values (IDs, text, dates), as data from Excel or CSV needs;
+    clean=False only sets dtypes, for data normalised when it was written.
+    Columns the sheet doesn't declare are left alone.
+    """
+    columns = {}
+    for col, kind in SHEET_SCHEMA[sheet].items():
+        if col not in df.columns:
+            continue
+        series = df[col]
+        if kind == 'number':
+            series = pd.to_numeric(series, errors='coerce').astype('float64')
+        elif kind in ('category', 'status'):
+            if clean:
+                series = _map_unique(series, normalize_text)
+            series = series.astype('category')
+        elif not clean:
+            continue
+        elif kind == 'date':
+            series = _map_unique(series, _loaded_date)
+        else:
+            series = series.map(normalize_text, na_action='ignore').astype(object)
+        columns[col] = series
+    return df.assign(**columns)
+
+
+def coerce_record(sheet, record):
+    """
+    The sheet's columns from record (a dict), each converted to its declared
+    type. Raises ValueError for a missing Student ID, an attendance status
+    other than Present/Absent, a bad date or marks that aren't a number.
+    """
+    result = {}
+    for col, kind in SHEET_SCHEMA[sheet].items():
+        value = record.get(col)
+        if kind == 'date':
+            value = normalize_date(value)
+        elif kind == 'number':
+            if _is_blank(value) or (isinstance(value, str) and not value.strip()):
+                value = None
+            else:
+                try:
+                    value = float(value)
+                except (TypeError, ValueError):
+                    value = math.nan
+                if not math.isfinite(value):
+                    raise ValueError(f"{col} must be a number, not {record.get(col)!r}.")
+        else:
+            value = normalize_text(value)
+            if kind == 'id' and not value:
+                raise ValueError("Student ID is required.")
+            if kind == 'status' and value not in ATTENDANCE_STATUSES:
+                raise ValueError(f"{col} must be one of {', '.join(ATTENDANCE_STATUSES)}.")
+        result[col] = value
+    return result
+
+
+def marks_key(student_id, subject, exam):
+    """The key of a Marks Record row: one mark per student, subject and exam (case-insensitive)."""
+    return (student_id, (subject or '').casefold(), (exam or '').casefold())
+
+
+def empty_sheet(sheet):
+    return apply_schema(sheet, pd.DataFrame(columns=SHEET_COLUMNS[sheet]), clean=False)
+
+
+class StorageBackend:
+    """
+    Interface between DataManager and the place the records actually live.
+    Records are plain dicts keyed by the sheet column names.
+    """
+
+    def read(self, sheet):
+        raise NotImplementedError
+
+    def get_student(self, student_id):
+        raise NotImplementedError
+
+    def upsert_student(self, record):
+        """Insert or update a Student Master row. Returns True if it already existed."""
+        return self.upsert_students([record])[0]
+
+    def upsert_students(self, records):
+        """
+        Insert or update several Student Master rows in one commit. Returns
+        one True/False per record: whether that Student ID already existed.
+        """
+        raise NotImplementedError
+
+    def insert_attendance(self, record):
+        """Add a Daily Attendance row. Returns False if (Date, Student ID) is already marked."""
+        return self.insert_attendance_many([record])[0]
+
+    def insert_attendance_many(self, records):
+        """
+        Add several Daily Attendance rows in one commit, skipping any whose
+        (Date, Student ID) is already marked or repeated earlier in the batch.
+        Returns one True/False per record.
+        """
+        raise NotImplementedError
+
+    def upsert_marks(self, records):
+        """
+        Insert or replace several Marks Record rows in one commit, matched on
+        marks_key(). Returns one True/False per record: whether it replaced
+        marks already stored.
+        """
+        raise NotImplementedError
+
+    def append(self, sheet, records):
+        raise NotImplementedError
+
+    def replace_all(self, frames):
+        """Overwrite the given sheets ({sheet name: DataFrame}) in one go."""
+        raise NotImplementedError
+
+    def lock(self):
+        """
+        Cross-process lock (a FileLock) that DataManager holds around
+        read-modify-write cycles so several processes can share the store.
+        """
+        return self._file_lock
+
+    def version(self):
+        """
+        Opaque token that changes whenever the stored data changes, including
+        changes made by other processes. Used to invalidate derived caches.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class ExcelBackend(StorageBackend):
+    """
+    Keeps attendance.xlsx as the store of record, with all four sheets parsed
+    in memory. Mutations update the in-memory frames and a journal of dirty
+    sheets; a background flusher writes the workbook at most every
+    flush_interval seconds (0 = write through on every change) and on shutdown.
+    If the file is edited out of band (mtime changes) it is reloaded and any
+    unflushed changes are replayed on top.
+
+    Writes hold an fcntl lock on attendance.xlsx.lock, re-check the file for
+    changes made by other processes, and go to a temporary copy that is
+    renamed over the workbook, so readers never see a half-written zip. With
+    several processes (gunicorn workers), use flush_interval=0 so each change
+    is on disk before the lock is released.
+    """
+
+    def __init__(self, file_path='attendance.xlsx', flush_interval=5.0):
+        self.file_path = file_path
+        self.flush_interval = flush_interval
+        self._file_lock = FileLock(file_path + '.lock')
+        with self._file_lock:
+            if not os.path.exists(self.file_path):
+                self._write_atomic({sheet: empty_sheet(sheet) for sheet in SHEET_COLUMNS}, mode='w')
+                print(f"Initialized {self.file_path}")
+
+        self._lock = threading.RLock()
+        self._version = 0
+        self._journal = []      # unflushed mutations, replayed after an external reload
+        self._dirty = set()     # sheets that differ from the file on disk
+        self._pending = threading.Event()
+        self._closed = False
+        self._load()
+
+        if self.flush_interval > 0:
+            threading.Thread(target=self._flush_loop, daemon=True).start()
+        atexit.register(self.close)
+
+    def _load(self):
+        with phase('parse'):
+            # dtype=object skips pandas' type inference; the declared schema is applied instead
+            sheets = pd.read_excel(self.file_path, sheet_name=None, dtype=object)
+        # Values are normalised once here so every later comparison is a plain match
+        self.frames = {sheet: apply_schema(sheet, sheets[sheet]) if sheet in sheets else empty_sheet(sheet)
+                       for sheet in SHEET_COLUMNS}
+        self._index_daily()
+        self._version += 1
+        self._signature = self._file_signature()
+
+    def _file_signature(self):
+        # A rename-replaced file gets a new inode even if the mtime tick is the same
+        st = os.stat(self.file_path)
+        return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+    def _sync(self):
+        # Pick up edits made to the workbook by someone else (Excel, another process)
+        if self._file_signature() != self._signature:
+            self._load()
+            for op, args in self._journal:
+                getattr(self, '_apply_' + op)(*args)
+
+    def _mutate(self, op, *args):
+        with self._file_lock, self._lock:
+            self._sync()
+            result = getattr(self, '_apply_' + op)(*args)
+            self._journal.append((op, args))
+            if self.flush_interval > 0:
+                self._pending.set()
+            else:
+                self.flush()
+            return result
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._pending.wait()
+            # Let further changes within the window coalesce into one write
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error writing {self.file_path}: {e}")
+
+    def _write_atomic(self, frames, mode='a'):
+        """Write sheets to a temporary copy of the workbook, then rename it over the original."""
+        directory, name = os.path.split(os.path.abspath(self.file_path))
+        tmp = os.path.join(directory, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp.xlsx")
+        try:
+            with phase('write'):
+                if mode == 'a':
+                    shutil.copy2(self.file_path, tmp)
+                    writer = pd.ExcelWriter(tmp, engine='openpyxl', mode='a', if_sheet_exists='replace')
+                else:
+                    writer = pd.ExcelWriter(tmp, engine='openpyxl')
+                with writer:
+                    for sheet, df in frames.items():
+                        df.to_excel(writer, sheet_name=sheet, index=False)
+                os.replace(tmp, self.file_path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def flush(self):
+        # Lock order everywhere: file lock first, then the in-process lock
+        with self._file_lock, self._lock:
+            self._pending.clear()
+            if not self._dirty:
+                return
+            # Merge with anything another process wrote since we last looked
+            self._sync()
+            self._write_atomic({sheet: self.frames[sheet] for sheet in self._dirty})
+            self._signature = self._file_signature()
+            self._dirty.clear()
+            self._journal.clear()
+
+    def close(self):
+        self._closed = True
+        self._pending.set()
+        self.flush()
+
+    def version(self):
+        with self._lock:
+            self._sync()
+            return self._version
+
+    def read(self, sheet):
+        with self._lock:
+            self._sync()
+            return self.frames[sheet].copy()
+
+    def get_student(self, student_id):
+        with self._lock:
+            self._sync()
+            df_master = self.frames['Student Master']
+            student = df_master[df_master['Student ID'] == normalize_student_id(student_id)]
+            if not student.empty:
+                return student.iloc[0].to_dict()
+        return None
+
+    def upsert_students(self, records):
+        return self._mutate('upsert_students', [coerce_record('Student Master', r) for r in records])
+
+    def insert_attendance_many(self, records):
+        return self._mutate('insert_attendance_many', [coerce_record('Daily Attendance', r) for r in records])
+
+    def upsert_marks(self, records):
+        return self._mutate('upsert_marks', [coerce_record('Marks Record', r) for r in records])
+
+    def append(self, sheet, records):
+        self._mutate('append', sheet, [coerce_record(sheet, r) for r in records])
+
+    def replace_all(self, frames):
+        self._mutate('replace_all', frames)
+
+    def _apply_upsert_students(self, records):
+        columns = SHEET_COLUMNS['Student Master']
+        # Later records for the same ID win, as if upserted one at a time
+        df_new = pd.DataFrame(records, columns=columns).drop_duplicates('Student ID', keep='last')
+        # Excel may have inferred numeric columns (e.g. phone numbers); allow any value
+        df_master = self.frames['Student Master'].astype(object).reset_index(drop=True)
+        ids = pd.Index(df_master['Student ID'])
+        positions = ids.get_indexer(df_new['Student ID'])
+        existing = positions >= 0
+        if existing.any():
+            # Overwrite matched rows in place, keeping their position in the sheet
+            df_master.iloc[positions[existing], :] = df_new[existing][columns].to_numpy(dtype=object)
+        if not existing.all():
+            df_master = pd.concat([df_master, df_new[~existing]], ignore_index=True)
+        self._set('Student Master', df_master)
+        return [r['Student ID'] in ids for r in records]
+
+    def _apply_upsert_marks(self, records):
+        df_marks = self.frames['Marks Record'].reset_index(drop=True)
+        rows = {}   # key -> row numbers (older sheets may hold repeats)
+        for i, key in enumerate(map(marks_key, df_marks['Student ID'], df_marks['Subject'], df_marks['Exam Name'])):
+            rows.setdefault(key, []).append(i)
+        replaced, positions, new = [], [], {}
+        for record in records:
+            key = marks_key(record['Student ID'], record['Subject'], record['Exam Name'])
+            replaced.append(key in rows or key in new)
+            if key in rows:
+                positions.extend((i, record['Marks Obtained']) for i in rows[key])
+            elif key in new:
+                new[key] = dict(new[key], **{'Marks Obtained': record['Marks Obtained']})
+            else:
+                new[key] = record
+        if positions:
+            # Overwrite the marks in place; the row keeps its position in the sheet
+            index, marks = zip(*positions)
+            df_marks.loc[list(index), 'Marks Obtained'] = list(marks)
+        if new:
+            df_marks = pd.concat([df_marks, pd.DataFrame(list(new.values()), columns=SHEET_COLUMNS['Marks Record'])],
+                                 ignore_index=True)
+        self._set('Marks Record', df_marks)
+        return replaced
+
+    def _index_daily(self):
+        # (Date, Student ID) is Daily Attendance's unique key, as in the SQLite table
+        df_daily = self.frames['Daily Attendance']
+        self._daily_keys = set(zip(df_daily['Date'], df_daily['Student ID']))
+
+    def _apply_insert_attendance_many(self, records):
+        inserted = []
+        for record in records:
+            key = (record['Date'], record['Student ID'])
+            inserted.append(key not in self._daily_keys)
+            self._daily_keys.add(key)
+        new = [record for record, ok in zip(records, inserted) if ok]
+        if new:
+            df_new = pd.DataFrame(new, columns=SHEET_COLUMNS['Daily Attendance'])
+            self._set('Daily Attendance', pd.concat([self.frames['Daily Attendance'], df_new], ignore_index=True))
+        return inserted
+
+    def _apply_append(self, sheet, records):
+        self._set(sheet, pd.concat([self.frames[sheet], pd.DataFrame(records)], ignore_index=True))
+
+    def _apply_replace_all(self, frames):
+        for sheet, df in frames.items():
+            self._set(sheet, apply_schema(sheet, df.copy()))
+        if 'Daily Attendance' in frames:
+            self._index_daily()
+
+    def _set(self, sheet, df):
+        # concat with new records turns categoricals back into objects
+        self.frames[sheet] = apply_schema(sheet, df, clean=False)
+        self._dirty.add(sheet)
+        self._version += 1
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Indexed storage in an embedded SQLite database. Student ID is the primary
+    key of Student Master and (Date, Student ID) is unique in Daily Attendance,
+    so single-row lookups and writes no longer touch the whole data set.
+    """
+
+    TABLES = {
+        'Student Master': 'student_master',
+        'Daily Attendance': 'daily_attendance',
+        'Attendance History': 'attendance_history',
+        'Marks Record': 'marks_record',
+    }
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS student_master (
+            "Student ID" TEXT PRIMARY KEY,
+            "Name" TEXT,
+            "Department" TEXT,
+            "Parent Name" TEXT,
+            "Parent Phone Number" TEXT
+        );
+        CREATE TABLE IF NOT EXISTS daily_attendance (
+            "Date" TEXT NOT NULL,
+            "Student ID" TEXT NOT NULL,
+            "Attendance Status" TEXT,
+            "Reason for Leave" TEXT
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_daily_date_student
+            ON daily_attendance ("Date", "Student ID");
+        CREATE TABLE IF NOT EXISTS attendance_history (
+            "Date" TEXT,
+            "Student ID" TEXT,
+            "Attendance Status" TEXT,
+            "Reason for Leave" TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_history_date_student
+            ON attendance_history ("Date", "Student ID");
+        CREATE TABLE IF NOT EXISTS marks_record (
+            "Student ID" TEXT,
+            "Subject" TEXT,
+            "Exam Name" TEXT,
+            "Marks Obtained" REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_marks_student ON marks_record ("Student ID");
+    """
+
+    def __init__(self, db_path='attendance.db'):
+        self.db_path = db_path
+        self.created = not os.path.exists(db_path)
+        # One connection shared by the Flask threads, serialised by a lock.
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(db_path + '.lock')
+        # Autocommit mode; write transactions are opened explicitly in _transaction()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(self.SCHEMA)
+        self._writes = 0
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes SQLite's write lock up front, so a check-then-write
+        # (e.g. upsert_student) cannot interleave with another process
+        with self._lock, phase('write'):
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+            self._writes += 1
+
+    @staticmethod
+    def _columns(sheet):
+        return ', '.join(f'"{c}"' for c in SHEET_COLUMNS[sheet])
+
+    def _insert_sql(self, sheet, verb='INSERT'):
+        placeholders = ', '.join('?' for _ in SHEET_COLUMNS[sheet])
+        return f'{verb} INTO {self.TABLES[sheet]} ({self._columns(sheet)}) VALUES ({placeholders})'
+
+    @staticmethod
+    def _row(sheet, record):
+        return tuple(record.get(c) for c in SHEET_COLUMNS[sheet])
+
+    def version(self):
+        # data_version moves when another connection commits; _writes counts ours
+        with self._lock:
+            return (self.conn.execute('PRAGMA data_version').fetchone()[0], self._writes)
+
+    def read(self, sheet):
+        with self._lock, phase('parse'):
+            df = pd.read_sql_query(
+                f'SELECT {self._columns(sheet)} FROM {self.TABLES[sheet]} ORDER BY rowid', self.conn)
+            # Values were coerced on the way in; only the dtypes need setting
+            return apply_schema(sheet, df, clean=False)
+
+    def get_student(self, student_id):
+        with self._lock:
+            cur = self.conn.execute(
+                f'SELECT {self._columns("Student Master")} FROM student_master WHERE "Student ID" = ?',
+                (normalize_student_id(student_id),))
+            row = cur.fetchone()
+        if row is None:
+            return None
+        return dict(zip(SHEET_COLUMNS['Student Master'], row))
+
+    def upsert_students(self, records):
+        records = [coerce_record('Student Master', r) for r in records]
+        ids = [r['Student ID'] for r in records]
+        # Update in place (keeps the row's position, unlike INSERT OR REPLACE)
+        updates = ', '.join(f'"{c}" = excluded."{c}"' for c in SHEET_COLUMNS['Student Master'][1:])
+        sql = self._insert_sql('Student Master') + f' ON CONFLICT ("Student ID") DO UPDATE SET {updates}'
+        existing = set()
+        with self._transaction():
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                existing.update(row[0] for row in self.conn.execute(
+                    f'SELECT "Student ID" FROM student_master WHERE "Student ID" IN ({", ".join("?" * len(batch))})',
+                    batch))
+            self.conn.executemany(sql, [self._row('Student Master', r) for r in records])
+        return [sid in existing for sid in ids]
+
+    def insert_attendance_many(self, records):
+        sql = self._insert_sql('Daily Attendance', 'INSERT OR IGNORE')
+        records = [coerce_record('Daily Attendance', r) for r in records]
+        inserted = []
+        with self._transaction():
+            # The unique (Date, Student ID) index rejects duplicates row by row
+            for record in records:
+                cur = self.conn.execute(sql, self._row('Daily Attendance', record))
+                inserted.append(cur.rowcount == 1)
+        return inserted
+
+    def upsert_marks(self, records):
+        records = [coerce_record('Marks Record', r) for r in records]
+        insert = self._insert_sql('Marks Record')
+        # NOCASE matches marks_key() for ASCII subject and exam names
+        update = ('UPDATE marks_record SET "Marks Obtained" = ? WHERE "Student ID" = ? '
+                  'AND "Subject" = ? COLLATE NOCASE AND "Exam Name" = ? COLLATE NOCASE')
+        replaced = []
+        with self._transaction():
+            # idx_marks_student narrows each update to the student's own rows
+            for r in records:
+                cur = self.conn.execute(update, (r['Marks Obtained'], r['Student ID'],
+                                                 r['Subject'] or '', r['Exam Name'] or ''))
+                replaced.append(cur.rowcount > 0)
+                if not replaced[-1]:
+                    self.conn.execute(insert, self._row('Marks Record', r))
+        return replaced
+
+    def append(self, sheet, records):
+        records = [coerce_record(sheet, r) for r in records]
+        with self._transaction():
+            self.conn.executemany(self._insert_sql(sheet), [self._row(sheet, r) for r in records])
+
+    def replace_all(self, frames):
+        with self._transaction():
+            for sheet, df in frames.items():
+                df = apply_schema(sheet, df.reindex(columns=SHEET_COLUMNS[sheet]))
+                self.conn.execute(f'DELETE FROM {self.TABLES[sheet]}')
+                # Excel leaves blanks as NaN; store them as NULL
+                rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+                verb = 'INSERT OR REPLACE' if sheet in ('Student Master', 'Daily Attendance') else 'INSERT'
+                self.conn.executemany(self._insert_sql(sheet, verb), list(rows))
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
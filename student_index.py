@@ -0,0 +1,105 @@
+import base64
+import json
+from bisect import bisect_left, bisect_right, insort
+
+from storage import normalize_student_id
+
+
+def _name_key(name):
+    return name.strip().casefold() if isinstance(name, str) else ''
+
+
+def encode_cursor(key):
+    """Opaque, URL-safe form of a page() cursor."""
+    raw = json.dumps(key if isinstance(key, str) else list(key)).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor. Raises ValueError for anything it didn't produce."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if isinstance(key, str):
+        return key
+    if isinstance(key, list) and len(key) == 2 and all(isinstance(k, str) for k in key):
+        return tuple(key)
+    raise ValueError("Invalid cursor")
+
+
+class StudentIndex:
+    """
+    Hashed index over Student Master keyed by the canonical Student ID, so
+    existence checks and parent-info lookups are O(1) dictionary hits instead
+    of a scan (and astype(str)) over the whole sheet.
+
+    Two sorted lists back paging and prefix search: the Student IDs, and
+    (casefolded name, Student ID) pairs. A prefix is a contiguous run in
+    either list, found by bisection.
+    """
+
+    def __init__(self, df_master):
+        self.records = {}
+        for record in df_master.to_dict(orient='records'):
+            self.records[record['Student ID']] = record
+        self._ids = sorted(self.records)
+        self._names = sorted((_name_key(r['Name']), sid) for sid, r in self.records.items())
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, student_id):
+        return normalize_student_id(student_id) in self.records
+
+    def get(self, student_id):
+        record = self.records.get(normalize_student_id(student_id))
+        return dict(record) if record else None
+
+    def upsert(self, record):
+        sid = record['Student ID']
+        old = self.records.get(sid)
+        if old is None:
+            insort(self._ids, sid)
+        else:
+            del self._names[bisect_left(self._names, (_name_key(old['Name']), sid))]
+        insort(self._names, (_name_key(record['Name']), sid))
+        self.records[sid] = dict(record)
+
+    def page(self, dept=None, id_prefix=None, name_prefix=None, after=None, limit=None):
+        """
+        Students matching every given filter, in Student ID order, or in name
+        order when name_prefix is given (case-insensitive). Returns
+        (records, cursor); pass the cursor back as `after` for the next page.
+        The cursor is None when no further student matches.
+        """
+        id_prefix = str(id_prefix).strip() if id_prefix else ''
+        if name_prefix:
+            prefix = _name_key(name_prefix)
+            keys, start = self._names, bisect_left(self._names, (prefix,))
+            in_range = lambda key: key[0].startswith(prefix)
+            sid_of = lambda key: key[1]
+        else:
+            keys, start = self._ids, bisect_left(self._ids, id_prefix)
+            in_range = lambda key: key.startswith(id_prefix)
+            sid_of = lambda key: key
+        if after is not None:
+            if isinstance(after, tuple) != bool(name_prefix):
+                raise ValueError("Cursor does not belong to this query")
+            start = max(start, bisect_right(keys, after))
+
+        rows, last = [], None
+        for i in range(start, len(keys)):
+            key = keys[i]
+            if not in_range(key):
+                break
+            sid = sid_of(key)
+            record = self.records[sid]
+            if (id_prefix and not sid.startswith(id_prefix)) or (dept and record['Department'] != dept):
+                continue
+            if limit is not None and len(rows) >= limit:
+                # Another match exists, so the next page won't be empty
+                return rows, last
+            rows.append(dict(record))
+            last = key
+        return rows, None
@@ -0,0 +1,101 @@
+import queue
+import threading
+from collections import OrderedDict
+
+
+class TkExecutor:
+    """
+    Runs blocking work (DataManager I/O, Twilio calls) on a background thread
+    and hands the results back to the Tk main loop, so the window never
+    freezes. Widgets are only touched on the main thread: finished tasks go
+    through a queue that is drained with root.after, the same queue-plus-poll
+    pattern JarvisGUI uses for voice commands.
+
+    Tasks run one at a time in submission order, so a write submitted before
+    a refresh is always visible to it. A task submitted with a `key` replaces
+    a not-yet-started task with the same key (keeping its place in line),
+    so a burst of refreshes collapses into one that uses the latest arguments.
+
+    on_busy(True/False) is called on the main thread when work starts and
+    when the last pending task has finished.
+    """
+
+    def __init__(self, root, on_busy=None, poll_ms=50):
+        self.root = root
+        self.on_busy = on_busy
+        self.poll_ms = poll_ms
+        self._pending = OrderedDict()   # key -> (fn, on_done, on_error)
+        self._cond = threading.Condition()
+        self._done = queue.Queue()
+        self._outstanding = 0           # submitted but not yet called back
+        self._busy = False
+        self._seq = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="tk-executor", daemon=True)
+        self._thread.start()
+        self.root.after(self.poll_ms, self._poll)
+
+    def submit(self, fn, on_done=None, on_error=None, key=None):
+        """Run fn() in the background, then on_done(result) or on_error(exc) on the main thread."""
+        with self._cond:
+            if key is None:
+                self._seq += 1
+                key = ('_task', self._seq)
+            if key not in self._pending:
+                self._outstanding += 1
+            self._pending[key] = (fn, on_done, on_error)
+            self._cond.notify()
+        self._set_busy(True)
+
+    def shutdown(self, wait=True):
+        """Finish the queued tasks (their callbacks are dropped) and stop the thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if wait:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                _, (fn, on_done, on_error) = self._pending.popitem(last=False)
+            try:
+                self._done.put((on_done, fn(), None))
+            except Exception as e:
+                self._done.put((on_error, None, e))
+
+    def _poll(self):
+        try:
+            while True:
+                callback, result, error = self._done.get_nowait()
+                with self._cond:
+                    self._outstanding -= 1
+                try:
+                    if error is not None:
+                        if callback:
+                            callback(error)
+                        else:
+                            print(f"Background task failed: {error}")
+                    elif callback:
+                        callback(result)
+                except Exception as e:
+                    print(f"Error in task callback: {e}")
+        except queue.Empty:
+            pass
+        with self._cond:
+            idle = self._outstanding == 0
+        if idle:
+            self._set_busy(False)
+        if not self._closed:
+            self.root.after(self.poll_ms, self._poll)
+
+    def _set_busy(self, busy):
+        # Called from submit() and _poll(), both on the main thread
+        if busy != self._busy:
+            self._busy = busy
+            if self.on_busy:
+                self.on_busy(busy)
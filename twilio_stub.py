@@ -0,0 +1,51 @@
+# twilio_stub.py — local stand-in for the Twilio Messages API, for testing the
+# notification queue without sending real WhatsApp messages.
+#
+#   python twilio_stub.py            (listens on :5055)
+#   TWILIO_ACCOUNT_SID=ACtest TWILIO_AUTH_TOKEN=x TWILIO_WHATSAPP_FROM=whatsapp:+14155238886 \
+#   TWILIO_API_BASE_URL=http://127.0.0.1:5055 python server.py
+#
+# STUB_DELAY (seconds) slows every request down; STUB_FAIL_RATE (0..1) makes a
+# share of them fail with HTTP 500 so retries can be exercised.
+
+from flask import Flask, jsonify, request
+import os
+import random
+import threading
+import time
+import uuid
+
+app = Flask(__name__)
+
+DELAY = float(os.environ.get('STUB_DELAY', '0'))
+FAIL_RATE = float(os.environ.get('STUB_FAIL_RATE', '0'))
+
+_lock = threading.Lock()
+sent_messages = []
+
+@app.route('/2010-04-01/Accounts/<account_sid>/Messages.json', methods=['POST'])
+def create_message(account_sid):
+    if DELAY:
+        time.sleep(DELAY)
+    if random.random() < FAIL_RATE:
+        return jsonify({"code": 20500, "message": "Stub failure", "status": 500}), 500
+
+    message = {
+        "sid": "SM" + uuid.uuid4().hex,
+        "account_sid": account_sid,
+        "from": request.form.get('From'),
+        "to": request.form.get('To'),
+        "body": request.form.get('Body'),
+        "status": "queued",
+    }
+    with _lock:
+        sent_messages.append(message)
+    return jsonify(message), 201
+
+@app.route('/messages', methods=['GET'])
+def list_messages():
+    with _lock:
+        return jsonify(sent_messages)
+
+if __name__ == '__main__':
+    app.run(host='127.0.0.1', port=int(os.environ.get('STUB_PORT', '5055')))
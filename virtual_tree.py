@@ -0,0 +1,194 @@
+import tkinter as tk
+from tkinter import ttk
+
+
+def _sort_key(value):
+    # Numbers (and numeric strings such as marks) sort numerically, before text
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return (1, 0.0, str(value).casefold())
+    if number != number:  # NaN / empty cell
+        return (2, 0.0, '')
+    return (0, number, '')
+
+
+class VirtualTreeview:
+    """
+    A Treeview that shows a window onto an in-memory list of row tuples.
+    Only as many items as fit on screen exist in the widget; scrolling and
+    changes rewrite their values instead of inserting and deleting rows, so
+    the cost of a refresh doesn't grow with the size of the sheet.
+
+    Filtering (case-insensitive substring over every column) and sorting
+    (click a heading, click again to reverse) work on the row list. upsert(),
+    append() and remove() apply a single change in place; load() replaces
+    everything. `key(row)` identifies rows for upsert()/remove().
+    """
+
+    ROW_HEIGHT = 20
+    HEADING_HEIGHT = 25
+
+    def __init__(self, parent, columns, widths, key=None):
+        self.frame = ttk.Frame(parent)
+        self.columns = columns
+        self.key = key
+        self.tree = ttk.Treeview(self.frame, columns=columns, show='headings', height=1)
+        for col, width in zip(columns, widths):
+            self.tree.heading(col, text=col, command=lambda c=col: self.sort_by(c))
+            self.tree.column(col, width=width)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient='vertical', command=self._on_scrollbar)
+        self.scrollbar.pack(side='right', fill='y', pady=5)
+        self.tree.pack(expand=True, fill='both', padx=5, pady=5)
+
+        self.rows = []          # every row, in load/insert order
+        self.positions = {}     # key -> index in rows
+        self.view = []          # rows that pass the filter, in display order
+        self.filter_text = ''
+        self.sort_col = None
+        self.sort_desc = False
+        self.offset = 0         # index in view of the first visible row
+        self.capacity = 1       # rows that fit on screen
+        self.slots = []         # (iid, values shown) for the visible items
+
+        style_height = ttk.Style().lookup('Treeview', 'rowheight')
+        self.row_height = int(style_height) if style_height else self.ROW_HEIGHT
+        self.tree.bind('<Configure>', self._on_resize)
+        self.tree.bind('<MouseWheel>', lambda e: self.scroll(-1 if e.delta > 0 else 1, 'units', 3))
+        self.tree.bind('<Button-4>', lambda e: self.scroll(-1, 'units', 3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll(1, 'units', 3))
+        self.tree.bind('<Prior>', lambda e: self.scroll(-1, 'pages'))
+        self.tree.bind('<Next>', lambda e: self.scroll(1, 'pages'))
+
+    # ---------------- data ----------------
+    def load(self, rows):
+        self.rows = list(rows)
+        if self.key:
+            self.positions = {self.key(row): i for i, row in enumerate(self.rows)}
+        self._rebuild_view()
+
+    def upsert(self, row):
+        """Replace the row with the same key, or add it."""
+        i = self.positions.get(self.key(row)) if self.key else None
+        if i is None:
+            self.append(row)
+            return
+        old, self.rows[i] = self.rows[i], row
+        self._unplace(old)
+        self._place(row)
+        self.render()
+
+    def append(self, row):
+        if self.key:
+            self.positions[self.key(row)] = len(self.rows)
+        self.rows.append(row)
+        self._place(row)
+        self.render()
+
+    def remove(self, key):
+        i = self.positions.pop(key, None)
+        if i is None:
+            return
+        row = self.rows.pop(i)
+        for k, j in self.positions.items():
+            if j > i:
+                self.positions[k] = j - 1
+        self._unplace(row)
+        self.render()
+
+    def set_filter(self, text):
+        text = text.strip().casefold()
+        if text != self.filter_text:
+            self.filter_text = text
+            self._rebuild_view()
+
+    def sort_by(self, col):
+        if col == self.sort_col:
+            self.sort_desc = not self.sort_desc
+        else:
+            self.sort_col, self.sort_desc = col, False
+        for c in self.columns:
+            arrow = (' ▼' if self.sort_desc else ' ▲') if c == col else ''
+            self.tree.heading(c, text=c + arrow)
+        self._rebuild_view()
+
+    def _matches(self, row):
+        if not self.filter_text:
+            return True
+        return self.filter_text in ' '.join(map(str, row)).casefold()
+
+    def _row_key(self, row):
+        return _sort_key(row[self.columns.index(self.sort_col)])
+
+    def _rebuild_view(self):
+        view = [row for row in self.rows if self._matches(row)] if self.filter_text else list(self.rows)
+        if self.sort_col is not None:
+            view.sort(key=self._row_key, reverse=self.sort_desc)
+        self.view = view
+        self.render()
+
+    def _place(self, row):
+        if not self._matches(row):
+            return
+        if self.sort_col is None:
+            self.view.append(row)
+            return
+        # Binary search for the row's place in the current sort order
+        key = self._row_key(row)
+        lo, hi = 0, len(self.view)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            other = self._row_key(self.view[mid])
+            if (other >= key) if self.sort_desc else (other <= key):
+                lo = mid + 1
+            else:
+                hi = mid
+        self.view.insert(lo, row)
+
+    def _unplace(self, row):
+        try:
+            self.view.remove(row)
+        except ValueError:
+            pass
+
+    # ---------------- widget ----------------
+    def scroll(self, amount, what='units', step=1):
+        page = max(self.capacity - 1, 1)
+        self.offset += amount * (page if what == 'pages' else step)
+        self.render()
+        return 'break'
+
+    def _on_scrollbar(self, action, amount, what=None):
+        if action == 'moveto':
+            self.offset = int(float(amount) * len(self.view))
+            self.render()
+        else:
+            self.scroll(int(amount), what)
+
+    def _on_resize(self, event):
+        capacity = max((event.height - self.HEADING_HEIGHT) // self.row_height, 1)
+        if capacity != self.capacity:
+            self.capacity = capacity
+            self.render()
+
+    def render(self):
+        """Show view[offset:offset + capacity] using at most `capacity` items."""
+        total = len(self.view)
+        self.offset = max(min(self.offset, total - self.capacity), 0)
+        visible = self.view[self.offset:self.offset + self.capacity]
+
+        while len(self.slots) > len(visible):
+            iid, _ = self.slots.pop()
+            self.tree.delete(iid)
+        while len(self.slots) < len(visible):
+            self.slots.append((self.tree.insert('', tk.END, values=()), None))
+        for i, row in enumerate(visible):
+            iid, shown = self.slots[i]
+            if shown != row:
+                self.tree.item(iid, values=row)
+                self.slots[i] = (iid, row)
+
+        if total:
+            self.scrollbar.set(self.offset / total, (self.offset + len(visible)) / total)
+        else:
+            self.scrollbar.set(0, 1)